@@ -0,0 +1,119 @@
+"""
+Benchmarks of Tecmag .tnt file reading and translation.
+
+    python benchmark.py [--quick] [--json FILE]    # synthetic files of all versions and sizes
+    python benchmark.py file.tnt [...]             # given files
+"""
+
+__author__ = "ijakovac@phy.hr"
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from tecmag import TNTReader
+from translator import translate
+from tntwriter import synthetic
+
+VERSIONS = ['TNT1.003', 'TNT1.005', 'TNT1.007', 'TNT1.008']
+TYPES = ['fsw', 'att', 't1', '']
+# (points, measurements)
+SIZES = [(1024, 1), (8192, 1), (1024, 64), (8192, 128), (32768, 256)]
+QUICK_SIZES = [(1024, 1), (1024, 64), (8192, 32)]
+
+def best_time(fn, repeat=5, number=20):
+    """
+    Best average time of fn() in seconds (of repeat runs with number calls each).
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start)/number)
+    return best
+
+def header_parse(file):
+    """
+    Time of opening a file without its data and of parsing its PSEQ section alone.
+    """
+    tnt = TNTReader(file, header_only=True)
+    pseq = tnt.section('PSEQ')
+    version = tnt.version
+    def parse():
+        # pseq_read may switch the version of a mis-tagged file
+        tnt.version = version
+        tnt.pseq_read(pseq)
+    return {'open': best_time(lambda: TNTReader(file, header_only=True)),
+            'pseq_read': best_time(parse)}
+
+def data_read(file):
+    """
+    Throughput (MB/s) of reading all data of a file through the memmap.
+    """
+    size = TNTReader(file, header_only=True).tnt_sections['DATA']['length']
+    number = max(1, min(20, 2**27 // max(size, 1)))
+    return size/1e6/best_time(lambda: np.array(TNTReader(file).data), repeat=3, number=number)
+
+def dat_write(file, directory):
+    """
+    Throughput (MB/s of written .dat) and time of translating a file.
+    """
+    file_name = os.path.join(directory, os.path.basename(file).replace('.tnt', '.dat'))
+    seconds = best_time(lambda: translate(file, file_name), repeat=3, number=1)
+    return os.path.getsize(file_name)/1e6/seconds, seconds
+
+def measure(file, directory):
+    times = header_parse(file)
+    write, seconds = dat_write(file, directory)
+    return {'file': os.path.basename(file), 'open_ms': times['open']*1e3, 'pseq_read_ms': times['pseq_read']*1e3,
+            'read_MBps': data_read(file), 'write_MBps': write, 'translate_s': seconds}
+
+def synthetic_files(directory, sizes):
+    """
+    Write synthetic files of all versions and types (largest size only for TNT1.008 fsw).
+    """
+    files = []
+    for version in VERSIONS:
+        for typ in TYPES:
+            for npts, measurements in sizes:
+                if (npts, measurements) != sizes[0] and (version, typ) != ('TNT1.008', 'fsw'):
+                    continue
+                file = os.path.join(directory, '{}_{}_{}x{}.tnt'.format(version, typ or '1D', npts, measurements))
+                synthetic(file, typ, npts, measurements, version)
+                files.append(file)
+    return files
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark .tnt parsing, reading and translation.')
+    parser.add_argument('files', nargs='*', help='.tnt files (default: synthetic files)')
+    parser.add_argument('--quick', action='store_true', help='small synthetic files only')
+    parser.add_argument('--json', default=None, metavar='FILE', help='write results to a JSON file')
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix='tnt_benchmark_')
+    try:
+        files = args.files or synthetic_files(directory, QUICK_SIZES if args.quick else SIZES)
+        results = []
+        print('{:<36}{:>10}{:>12}{:>12}{:>12}{:>12}'.format('file', 'open ms', 'pseq ms', 'read MB/s', 'write MB/s', 'translate s'))
+        for file in files:
+            result = measure(file, directory)
+            results.append(result)
+            print('{file:<36}{open_ms:>10.3f}{pseq_read_ms:>12.3f}{read_MBps:>12.0f}{write_MBps:>12.1f}{translate_s:>12.3f}'.format(**result))
+            sys.stdout.flush()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
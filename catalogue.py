@@ -0,0 +1,245 @@
+"""
+Searchable catalogue of Tecmag .tnt files.
+
+Only the fixed-size TMAG record and the sequence rows (for the experiment type)
+are read from each file, the data and the rest of the PSEQ section are skipped.
+The catalogue is updated incrementally, only new and modified files are read:
+    python catalogue.py directory [...] --nuclei 63Cu --type fsw --temperature 280 290 --field 8.9 9.1
+"""
+
+__author__ = "ijakovac@phy.hr"
+
+import argparse
+import os
+import sqlite3
+import sys
+
+import numpy as np
+
+from tecmag import TNTReader, Cursor, ANSI, sequence_rows, experiment_type
+from tntcache import default_path
+
+# catalogue columns (besides path, size and mtime)
+COLUMNS = ['version', 'magnet_field', 'ob_freq', 'actual_temperature', 'nuclei', 'points', 'measurements',
+           'date', 'sequence', 'experiment_type', 'error']
+
+def default_catalogue():
+    """
+    Default location of the catalogue file (next to the header cache).
+    """
+    return os.path.join(os.path.dirname(default_path()), 'catalogue.sqlite')
+
+def _text(value):
+    return value.rstrip(b'\0').decode(ANSI).strip()
+
+def read_entry(filename):
+    """
+    Read the catalogue entry of a .tnt file.
+
+    The file is expected in the order written by TNMR (TMAG, DATA, TMG2, PSEQ),
+    so the TMAG record is read at a fixed offset and the data are skipped using
+    the DATA length. Files in any other order are read by TNTReader.
+
+    Returns
+    -------
+    entry : dict
+        {column: value} for all COLUMNS
+
+    """
+    tlv = TNTReader.TNTTLV.itemsize
+    tmag_size = TNTReader.TNTTMAG.itemsize
+    with open(filename, 'rb') as tntfile:
+        head = tntfile.read(8 + tlv + tmag_size + tlv)
+        if not TNTReader.TNTMAGIC_RE.match(head[:8]):
+            raise ValueError("Invalid magic number (is '%s' really TNMR file?): %s" % (filename, head[:8]))
+        tags = [np.frombuffer(head, TNTReader.TNTTLV, count=1, offset=8)[0]]
+        tags.append(np.frombuffer(head, TNTReader.TNTTLV, count=1, offset=8 + tlv + tmag_size)[0])
+        if (tags[0]['tag'], tags[0]['length'], tags[1]['tag']) == (b'TMAG', tmag_size, b'DATA'):
+            tntfile.seek(int(tags[1]['length']), 1)
+            tags.append(np.frombuffer(tntfile.read(tlv), TNTReader.TNTTLV, count=1)[0])
+            tntfile.seek(int(tags[2]['length']), 1)
+            pseq = tntfile.read(tlv)
+        else:
+            pseq = b''
+        if tags[-1]['tag'] != b'TMG2' or pseq[:4] != b'PSEQ':
+            return _reader_entry(filename)
+        # PSEQ has no length, its data start at the place of the length field
+        pseq = pseq[8:] + tntfile.read()
+
+    tmag = np.frombuffer(head, TNTReader.TNTTMAG, count=1, offset=8 + tlv)[0]
+    binary = Cursor(pseq)
+    # skip SequenceID and file name (and e-mail of 1.18 sequences)
+    binary.seek(8)
+    binary.read_string()
+    if pseq[:4] == b'1.18':
+        binary.seek(8, 1)
+        binary.read_string()
+    binary.read_string()
+    dic = dict()
+    sequence_rows(binary, dic)
+    return _entry(head[:8].decode(), tmag, experiment_type(dic)[0])
+
+def _reader_entry(filename):
+    tnt = TNTReader(filename, header_only=True)
+    return _entry(tnt.version, tnt.tmag, tnt.experiment_type()[0])
+
+def _entry(version, tmag, typ):
+    npts = tmag['actual_npts']
+    return {'version': version, 'magnet_field': float(tmag['magnet_field']), 'ob_freq': float(tmag['ob_freq'][0]),
+            'actual_temperature': float(tmag['actual_temperature']), 'nuclei': _text(tmag['nuclei'][0]),
+            'points': int(npts[0]), 'measurements': int(npts[1:].prod()), 'date': _text(tmag['date']),
+            'sequence': _text(tmag['sequence']), 'experiment_type': typ, 'error': None}
+
+class Catalogue():
+    """
+    Catalogue entries of .tnt files stored in an SQLite file.
+
+    Entries are keyed by the absolute path of the file and are read again only
+    when the size or the modification time of the file changes. Files that
+    can't be read are kept with their error, so they are not read again either.
+
+    Parameters
+    ----------
+    path : str
+        Name of the catalogue file (default: default_catalogue())
+
+    """
+    def __init__(self, path=None):
+        self.path = path or default_catalogue()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=30)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS files ('
+                                    'path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, version TEXT, '
+                                    'magnet_field REAL, ob_freq REAL, actual_temperature REAL, nuclei TEXT, '
+                                    'points INTEGER, measurements INTEGER, date TEXT, sequence TEXT, '
+                                    'experiment_type TEXT, error TEXT)')
+
+    def update(self, directories):
+        """
+        Add new and modified .tnt files of directories (and their subdirectories),
+        remove entries of deleted files.
+
+        Returns
+        -------
+        read : int
+            Number of files read
+        removed : int
+            Number of removed entries
+
+        """
+        known = dict()
+        for path, size, mtime in self.connection.execute('SELECT path, size, mtime FROM files'):
+            known[path] = (size, mtime)
+        rows = []
+        removed = []
+        for directory in directories:
+            directory = os.path.abspath(directory)
+            found = set()
+            for root, _, names in os.walk(directory):
+                for name in names:
+                    if not name.endswith('.tnt'):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        # deleted during the scan, its entry is removed
+                        continue
+                    found.add(path)
+                    if known.get(path) == (stat.st_size, stat.st_mtime_ns):
+                        continue
+                    try:
+                        entry = read_entry(path)
+                    except Exception as err:
+                        entry = dict.fromkeys(COLUMNS)
+                        entry['error'] = '{}: {}'.format(type(err).__name__, err)
+                    rows.append([path, stat.st_size, stat.st_mtime_ns] + [entry[column] for column in COLUMNS])
+            prefix = os.path.join(directory, '')
+            removed.extend(path for path in known if path.startswith(prefix) and path not in found)
+
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO files VALUES ({})'.format(', '.join(['?']*(3+len(COLUMNS)))), rows)
+            self.connection.executemany('DELETE FROM files WHERE path = ?', [(path,) for path in removed])
+        return len(rows), len(removed)
+
+    def query(self, nuclei=None, experiment_type=None, temperature=None, field=None, frequency=None, directory=None):
+        """
+        Find catalogued files.
+
+        Parameters
+        ----------
+        nuclei : str
+            e.g. '63Cu'
+        experiment_type : str
+            'fsw', 'att', 't1' or '' (single spectrum)
+        temperature, field, frequency : tuple
+            (minimum, maximum) of actual_temperature (K), magnet_field (T) and ob_freq (MHz)
+        directory : str
+            Only files in the directory (and its subdirectories)
+
+        Returns
+        -------
+        entries : list
+            {'path': path, column: value} of matching files sorted by path
+
+        """
+        conditions = ['error IS NULL']
+        values = []
+        if nuclei is not None:
+            conditions.append('nuclei = ?')
+            values.append(nuclei)
+        if experiment_type is not None:
+            conditions.append('experiment_type = ?')
+            values.append(experiment_type)
+        for column, limits in [('actual_temperature', temperature), ('magnet_field', field), ('ob_freq', frequency)]:
+            if limits is not None:
+                conditions.append('{} BETWEEN ? AND ?'.format(column))
+                values.extend(limits)
+        if directory is not None:
+            # same prefix rule as update (LIKE would match '_' and '%' as wildcards and ignore case)
+            prefix = os.path.join(os.path.abspath(directory), '')
+            conditions.append('substr(path, 1, ?) = ?')
+            values.extend([len(prefix), prefix])
+        cursor = self.connection.execute('SELECT path, {} FROM files WHERE {} ORDER BY path'.format(
+            ', '.join(COLUMNS), ' AND '.join(conditions)), values)
+        return [dict(zip(['path'] + COLUMNS, row)) for row in cursor]
+
+    def errors(self):
+        """
+        Files that couldn't be read, as a list of (path, error) pairs.
+        """
+        return self.connection.execute('SELECT path, error FROM files WHERE error IS NOT NULL ORDER BY path').fetchall()
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Catalogue .tnt files of directories and find files by their parameters.')
+    parser.add_argument('directories', nargs='+', help='directories to catalogue and search')
+    parser.add_argument('--catalogue', default=None, metavar='PATH',
+                        help='catalogue file (default: {})'.format(default_catalogue()))
+    parser.add_argument('--nuclei', default=None, help='e.g. 63Cu')
+    parser.add_argument('--type', default=None, choices=['fsw', 'att', 't1', '1D'], help='experiment type')
+    parser.add_argument('--temperature', nargs=2, type=float, default=None, metavar=('MIN', 'MAX'), help='temperature (K)')
+    parser.add_argument('--field', nargs=2, type=float, default=None, metavar=('MIN', 'MAX'), help='magnetic field (T)')
+    parser.add_argument('--frequency', nargs=2, type=float, default=None, metavar=('MIN', 'MAX'), help='frequency (MHz)')
+    args = parser.parse_args(argv)
+
+    catalogue = Catalogue(args.catalogue)
+    read, removed = catalogue.update(args.directories)
+    print('{} file(s) read, {} removed, {} in catalogue.'.format(read, removed, len(catalogue)), file=sys.stderr)
+    typ = '' if args.type == '1D' else args.type
+    for directory in args.directories:
+        for entry in catalogue.query(args.nuclei, typ, args.temperature, args.field, args.frequency, directory):
+            print('{path}\t{nuclei}\t{experiment_type}\t{actual_temperature:.1f} K\t{magnet_field:.4f} T\t'
+                  '{ob_freq:.6f} MHz\t{points}x{measurements}\t{date}'.format(**entry))
+    catalogue.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
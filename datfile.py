@@ -0,0 +1,371 @@
+"""
+Functions for writing and reading Grenoble (LNCMI) .dat files.
+"""
+
+__author__ = "ijakovac@phy.hr"
+
+import functools
+import gzip
+import os
+
+import numpy as np
+
+from profiler import NULL_PROFILE
+
+# default memory budget (bytes) for data read at once
+MEMORY = 64*2**20
+
+# characters of one data point in the %Data% block ('-1.234E+05\t' for the imaginary and the real part)
+POINT_TEXT = 22
+
+# first bytes of gzip files
+GZIP_MAGIC = b'\x1f\x8b'
+
+def dat_name(file_name, compresslevel=None, suffix='', extension='.tnt'):
+    """
+    Name of the .dat file translated from a .tnt file (.dat.gz if compressed), suffix is added before .dat.
+
+    The extension (any case, e.g. .TNT) is replaced, names with another extension are kept whole
+    (e.g. 'file' gives 'file.dat'), so the .dat file never has the name of the input file.
+    """
+    root, ext = os.path.splitext(file_name)
+    if ext.lower() != extension:
+        root = file_name
+    return root + suffix + '.dat' + ('.gz' if compresslevel is not None else '')
+
+def check_output(file_name, inputs):
+    """
+    Raise ValueError if file_name is one of the input files (writing it would truncate the input).
+    """
+    if not os.path.exists(file_name):
+        return
+    for file in inputs:
+        if os.path.exists(file) and os.path.samefile(file_name, file):
+            raise ValueError("Output '{}' is the input file '{}'".format(file_name, file))
+
+def open_dat(file_name, mode='r', compresslevel=None):
+    """
+    Open a .dat file as text, compressed with gzip if compresslevel is given.
+
+    Compressed files are read transparently (recognized by their content, not by the name).
+
+    Parameters
+    ----------
+    file_name : str
+        Name of .dat file
+    mode : str
+        'r' or 'w'
+    compresslevel : int
+        gzip level for writing (1 fastest to 9 smallest), None writes plain text
+
+    """
+    if mode == 'r':
+        with open(file_name, 'rb') as f:
+            compressed = f.read(2) == GZIP_MAGIC
+        return gzip.open(file_name, 'rt') if compressed else open(file_name)
+    if compresslevel is not None:
+        # compressed as it is written
+        return gzip.open(file_name, 'wt', compresslevel=compresslevel)
+    return open(file_name, mode)
+
+@functools.lru_cache(maxsize=8)
+def _line_format(npts):
+    # one format string for a whole column, e.g. '%.3E\t%.3E\t...\t%.3E\n'
+    return '\t'.join(['%.3E']*npts) + '\n'
+
+def format_measurement(column, measurement, scans):
+    """
+    Format one measurement as a block of the %Data% section.
+
+    Parameters
+    ----------
+    column : ndarray
+        1D complex array of data points
+    measurement : int
+        Measurement number (counted from 1)
+    scans : int
+        Number of scans
+
+    Returns
+    -------
+    block : str
+        'measure' and 'scans' lines followed by the imaginary and the real line.
+
+    """
+    line = _line_format(len(column))
+    # tolist() converts whole column to Python floats at once, identical to float(np.real(...))
+    return ('measure {}\nscans {}\n'.format(measurement, scans) +
+            line % tuple(column.imag.tolist()) +
+            line % tuple(column.real.tolist()))
+
+def write_header(output, tnt, measurements=None, points=None, frequencies=None, step=1):
+    """
+    Write all sections preceding the %Data% block.
+
+    Parameters
+    ----------
+    output : file
+        Text file opened for writing
+    tnt : TNTReader
+        Translated .tnt file
+    measurements : slice
+        Exported measurements of the first plane (partial export), selects the swept values of level1
+    points : int
+        Number of exported points (partial export, default: record size of the file)
+    frequencies : ndarray
+        Frequencies (MHz) of the measurements replacing the sweep table (stitched sweeps)
+    step : int
+        Step between exported points (decimated partial export), DW is the dwell time times step
+
+    """
+    npts = tnt.tmag['actual_npts']
+    # partial exports (see TNTReader.view) are taken from the first plane, full exports hold all planes
+    partial = measurements is not None or points is not None
+    measurements = measurements or slice(None)
+    count = len(range(*measurements.indices(npts[1]))) if partial else int(np.prod(npts[1:]))
+    if frequencies is not None:
+        partial = True
+        count = len(frequencies)
+    # header, comments and details
+    output.write('%%\nPython translator\nFile translated from Tecmag spectrometer (TNT format)\n%End%\n\n')
+    output.write('%Program Comments%\n')
+    output.write('Repeat times: {}\n%End%\n\n'.format(int(tnt.params['repeat_times'])))
+    output.write('%Pulse Program%\nPulse prog details\n%End%\n\n')
+
+    # PhaseList
+    output.write('%Phase Lists%\nTl1\nTl2\nTl3\nRl1\nRl2\n%End%\n\n')
+
+    # Number of skipped transfers
+    output.write('%nb of skipped transfers%\n0\n%End%\n\n')
+
+    # Loops
+    output.write('%loops%\n1\t0\n1\t0\n%End%\n\n')
+
+    # Delays
+    output.write('%Delays%\n')
+    for key in tnt.params['Parameters'].keys():
+        output.write('{}\t{}\t0\n'.format(key, tnt.params['Parameters'][key]['Value']))
+    output.write('%End%\n\n')
+
+    # Parameters
+    output.write('%Parameters%\n')
+    output.write('Frequency\t{0:.6f} MHz\t{1}\n'.format(tnt.params['ob_freq'][0], tnt.params['obs_channel']))
+    output.write('Field\t{0:.5f} T\t0\n'.format(tnt.params['magnet_field']))
+    output.write('DW\t{0:.3f} us\t0\n'.format(float(tnt.params['dwell'][0])*step*10**6))
+    output.write('Sensitivity\t? V\t0\n')
+    output.write('Scans\t{}\t0\n'.format(int(tnt.params['scans'])))
+    output.write('Transfer\t{}\t0\n'.format(int(tnt.params['actual_scans'])))
+    output.write('Record size\t{}\t0\n'.format(int(tnt.params['acq_points']) if points is None else points))
+    output.write('Power\t0 dB\t0\n')
+    output.write('Aux. frequency\t{0:.2f} MHz\t0\n'.format(float(tnt.params['ref_freq'])))
+    output.write('Temperature\t{0:.1f} K\t0\n'.format(int(tnt.params['actual_temperature'])))
+    output.write('%End%\n\n')
+
+    # Variables: 2D table in level1, 3D table (of nested acquisitions) in level2
+    output.write('%Variables : level1%\n')
+    if frequencies is not None:
+        output.write('Frequency\t')
+        output.write('\t'.join(['%.6f MHz' % frequency for frequency in frequencies.tolist()]))
+    elif not write_variables(output, tnt, 2, measurements):
+        output.write('Frequency\t')
+        output.write('{0:.6f} MHz'.format(tnt.params['ob_freq'][0]))
+    output.write('\n\tNone\n%End%\n\n')
+
+    output.write('%Variables : level2%\n')
+    if not partial and write_variables(output, tnt, 3, slice(None)):
+        output.write('\n\tNone\n%End%\n\n')
+    else:
+        output.write('\tNone\n\tNone\n%End%\n\n')
+    output.write('%Nb max of Measurements%\n{}\n%End%\n\n'.format(count))
+    output.write('%Comments on experiment%\n{}\n%End%\n\n'.format(tnt.params['Comments']))
+
+    # Data output
+    output.write('%Data%\n')
+
+def write_variables(output, tnt, dimension, measurements):
+    """
+    Write the name and the values of the variable swept along a dimension (2 or 3).
+
+    Returns False (and writes nothing) if no table is swept along the dimension.
+    """
+    typ, table = tnt.experiment_type(dimension)
+    if typ == 'fsw' or typ == 'att':
+        output.write('Frequency\t')
+        # offsets are decoded once by TNTReader, empty entries are the observe frequency
+        offsets = np.nan_to_num(tnt.tables[table][0][measurements])
+        frequencies = tnt.params['ob_freq'][0] + offsets/10**6
+        output.write('\t'.join(['%.6f MHz' % frequency for frequency in frequencies.tolist()]))
+    elif typ == 't1':
+        output.write('delta\t')
+        # delays keep their original digits
+        output.write('\t'.join(list(map(lambda x: x.replace('u', ' us').replace('m', ' ms'), tnt.params['Tables'][table][measurements]))))
+    else:
+        return False
+    return True
+
+def columns(data):
+    """
+    Measurements of all planes as columns of a (points, measurements) array.
+
+    Measurements are counted in file order (Fortran order of the dimensions
+    after the first), so for the memory-mapped TNTReader.data this is a view.
+    """
+    return np.reshape(data, (data.shape[0], -1), order='F')
+
+def write_data(output, data, scans, memory=MEMORY, read=None, profile=NULL_PROFILE):
+    """
+    Write the %Data% block, one bulk write per measurement.
+
+    Parameters
+    ----------
+    output : file
+        Text file opened for writing
+    data : ndarray
+        Complex array of shape (points, measurements, ...), measurements of all planes are written
+    scans : int
+        Number of scans
+    memory : int
+        Memory budget in bytes; data are read in chunks of measurements not larger than this
+    read : function
+        read(start, stop) returns measurements start to stop as an array
+        (e.g. TNTReader.read_measurements, default: copy from data)
+    profile : Profile
+        Records time of formatting and writing and bytes written
+
+    """
+    # planes of 3D and 4D data follow each other, each chunk is still one sequential read
+    data = columns(data)
+    if read is None:
+        read = lambda start, stop: np.array(data[:, start:stop])
+    chunk = max(1, memory // max(1, data.shape[0]*data.itemsize))
+    for start in range(0, data.shape[1], chunk):
+        # one sequential read of the chunk, released before the next one
+        block = read(start, min(start+chunk, data.shape[1]))
+        for measurement in range(block.shape[1]):
+            with profile.stage('format'):
+                text = format_measurement(block[:, measurement], start+measurement+1, scans)
+            with profile.stage('write'):
+                output.write(text)
+            profile.bytes_written += len(text)
+        del block
+
+def read_header(input):
+    """
+    Read all sections preceding the %Data% block.
+
+    Parameters
+    ----------
+    input : file
+        Text file opened for reading, left at the first line of the %Data% block
+
+    Returns
+    -------
+    sections : dict
+        {section name: list of lines (without newlines)}, the first section is named ''
+    text : str
+        Header exactly as read, including the '%Data%' line
+
+    """
+    sections = dict()
+    lines = []
+    name = None
+    for line in iter(input.readline, ''):
+        lines.append(line)
+        line = line.rstrip('\n')
+        if line == '%Data%':
+            break
+        if line == '%End%':
+            name = None
+        elif name is None and len(line) > 1 and line.startswith('%') and line.endswith('%'):
+            name = line[1:-1]
+            sections[name] = []
+        elif name is not None:
+            sections[name].append(line)
+    return sections, ''.join(lines)
+
+def iter_measurements(input, dtype=np.complex64):
+    """
+    Read the %Data% block one measurement at a time.
+
+    Parameters
+    ----------
+    input : file
+        Text file opened for reading, positioned after the header (see read_header)
+    dtype : dtype
+        Complex type of the returned columns
+
+    Yields
+    ------
+    measurement : int
+        Measurement number (counted from 1)
+    scans : int
+        Number of scans
+    column : ndarray
+        1D complex array of data points
+
+    """
+    while True:
+        line = input.readline()
+        if not line.strip():
+            # blank lines may follow the last measurement
+            if not line:
+                return
+            continue
+        measurement = int(line.split()[1])
+        scans = int(input.readline().split()[1])
+        # whole lines are tokenized by NumPy, no Python float per point
+        imag = np.fromstring(input.readline(), sep='\t')
+        real = np.fromstring(input.readline(), sep='\t')
+        if len(imag) != len(real):
+            raise ValueError('Measurement {} has {} imaginary and {} real points'.format(measurement, len(imag), len(real)))
+        column = np.empty(len(real), dtype)
+        column.real = real
+        column.imag = imag
+        yield measurement, scans, column
+
+def read_dat(file_name, dtype=np.complex64):
+    """
+    Read a .dat file.
+
+    Parameters
+    ----------
+    file_name : str
+        Name of .dat file to read from (plain or gzip compressed)
+    dtype : dtype
+        Complex type of the returned data
+
+    Returns
+    -------
+    sections : dict
+        {section name: list of lines} of the header (see read_header)
+    data : ndarray
+        Complex array of shape (points, measurements)
+    scans : ndarray
+        Number of scans of each measurement
+
+    """
+    with open_dat(file_name) as input:
+        sections, _ = read_header(input)
+        try:
+            measurements = int(sections['Nb max of Measurements'][0])
+        except (KeyError, IndexError, ValueError):
+            measurements = None
+        columns = []
+        scans = []
+        data = None
+        for measurement, scan, column in iter_measurements(input, dtype):
+            if data is None and measurements:
+                # allocated once the number of points is known
+                data = np.empty((len(column), measurements), dtype, order='F')
+            if data is not None and len(scans) < measurements:
+                data[:, len(scans)] = column
+            else:
+                columns.append(column)
+            scans.append(scan)
+    if data is None:
+        data = np.stack(columns, axis=1) if columns else np.empty((0, 0), dtype)
+    else:
+        data = data[:, :min(len(scans), measurements)]
+        if columns:
+            data = np.concatenate([data, np.stack(columns, axis=1)], axis=1)
+    return sections, data, np.array(scans, dtype=int)
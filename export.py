@@ -0,0 +1,89 @@
+"""
+Binary export of Tecmag .tnt files: .npy data and .json parameters.
+
+The .npy file can be memory-mapped by analysis scripts:
+    data, params = load_binary('file')
+"""
+
+__author__ = "ijakovac@phy.hr"
+
+import json
+
+import numpy as np
+
+from tecmag import TNTReader, ANSI
+
+def jsonable(value):
+    """
+    Convert NumPy values and bytes of TNTReader.params to JSON types.
+    """
+    if isinstance(value, dict):
+        return {str(key): jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [jsonable(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return jsonable(value.tolist())
+    if isinstance(value, np.generic):
+        return jsonable(value.item())
+    if isinstance(value, bytes):
+        return value.decode(ANSI)
+    if isinstance(value, complex):
+        return [value.real, value.imag]
+    return value
+
+def export_binary(file, base_name=None):
+    """
+    Write the data of a .tnt file to .npy and its parameters to .json.
+
+    The data are written straight from the memory-mapped file with all four
+    dimensions (points, measurements, 3D, 4D) in Fortran order, exactly as
+    stored in the .tnt file, so no precision is lost.
+
+    Parameters
+    ----------
+    file : str or TNTReader
+        Name of .tnt file (or already opened file) to read from
+    base_name : str
+        Name of the output files without extension (default: file without .tnt)
+
+    Returns
+    -------
+    npy : str
+        Name of the data file
+    sidecar : str
+        Name of the parameters file
+
+    """
+    tnt = file if isinstance(file, TNTReader) else TNTReader(file)
+    if base_name is None:
+        base_name = tnt.filename[:-4] if tnt.filename.endswith('.tnt') else tnt.filename
+    npy, sidecar = base_name + '.npy', base_name + '.json'
+
+    # a Fortran-ordered memmap is written by ndarray.tofile without an intermediate copy
+    with open(npy, 'wb') as output:
+        np.lib.format.write_array(output, tnt.data, allow_pickle=False)
+
+    typ, table = tnt.experiment_type()
+    with open(sidecar, 'w') as output:
+        json.dump({'source': tnt.filename, 'version': tnt.version,
+                   'shape': list(tnt.data.shape), 'dtype': tnt.data.dtype.str,
+                   'experiment_type': typ, 'table': table,
+                   'params': jsonable(tnt.params)}, output, indent=1)
+    return npy, sidecar
+
+def load_binary(base_name, mmap_mode='r'):
+    """
+    Load exported data (memory-mapped by default) and parameters.
+
+    Returns
+    -------
+    data : ndarray
+        Array of NMR data.
+    info : dict
+        Contents of the .json file, info['params'] holds the Tecmag parameters
+
+    """
+    data = np.load(base_name + '.npy', mmap_mode=mmap_mode)
+    with open(base_name + '.json') as f:
+        info = json.load(f)
+    return data, info
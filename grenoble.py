@@ -8,15 +8,72 @@ Created on Thu Jan 16 09:35:39 2020
 """
 
 from tecmag import TNTReader
-import numpy as np
+from translator import translate
+from merge import merge
+from preview import preview
 from PyQt5 import QtWidgets, QtCore, QtGui
 from PyQt5.QtWidgets import QApplication, QMainWindow
 import sys
 
+RED = "QStatusBar{padding-left:8px;background:rgba(255,0,0,255);color:black;font-weight:bold;}"
+GREEN = "QStatusBar{padding-left:8px;background:rgba(0,255,0,255);color:black;font-weight:bold;}"
+
+class WorkerSignals(QtCore.QObject):
+    # index of the job, result and error message ('' if there was no error)
+    finished = QtCore.pyqtSignal(int, object, str)
+
+class Worker(QtCore.QRunnable):
+    # runs fn(*args) in a QThreadPool thread unless the batch was cancelled before it started
+    def __init__(self, index, cancelled, fn, *args):
+        super(Worker, self).__init__()
+        self.index = index
+        self.cancelled = cancelled
+        self.fn = fn
+        self.args = args
+        self.signals = WorkerSignals()
+
+    def run(self):
+        if self.cancelled():
+            self.signals.finished.emit(self.index, None, 'cancelled')
+            return
+        try:
+            result = self.fn(*self.args)
+        except Exception as err:
+            self.signals.finished.emit(self.index, None, '{}: {}'.format(type(err).__name__, err))
+        else:
+            self.signals.finished.emit(self.index, result, '')
+
+def render_preview(file, measurement, width, height):
+    # draws one measurement into an image; runs in a worker thread (QPainter may paint on a QImage there)
+    data = preview(file, measurement, width)
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB32)
+    image.fill(QtCore.Qt.white)
+    painter = QtGui.QPainter(image)
+    low, high = data['limits']
+    scale = (height-30)/(high-low) if high > low else 0.0
+    y = lambda value: height - 10 - (value-low)*scale
+    painter.setPen(QtCore.Qt.lightGray)
+    painter.drawLine(0, int(y(0.0)), width, int(y(0.0)))
+    for part, color in [('imag', QtCore.Qt.red), ('real', QtCore.Qt.blue)]:
+        painter.setPen(QtGui.QColor(color))
+        lows, highs = data[part][0].tolist(), data[part][1].tolist()
+        step = width/len(lows) if lows else 0.0
+        if data['points'] <= width:
+            # few points: connect them
+            painter.drawPolyline(QtGui.QPolygonF([QtCore.QPointF(i*step, y(v)) for i, v in enumerate(lows)]))
+        else:
+            # min/max envelope: one vertical line per pixel column
+            for i, (a, b) in enumerate(zip(lows, highs)):
+                painter.drawLine(QtCore.QLineF(i*step, y(a), i*step, y(b)))
+    painter.setPen(QtCore.Qt.black)
+    painter.drawText(5, 15, 'measurement {}/{}, {} points'.format(data['measurement']+1, data['measurements'], data['points']))
+    painter.end()
+    return image, data['measurements'], data['measurement']
+
 class Window(QMainWindow):
     def __init__(self):
         super(Window, self).__init__()
-        self.setGeometry(50, 50, 340, 220)
+        self.setGeometry(50, 50, 760, 250)
         self.setWindowTitle('Zagreb to Grenoble')
         self.setWindowIcon(QtGui.QIcon('tg.ico'))
         self.statusBar()
@@ -27,147 +84,176 @@ class Window(QMainWindow):
         self.list.addItem('... no file selected ...')
         self.list.move(20,20)
         self.list.resize(300,120)
+        self.list.currentItemChanged.connect(self.select_preview)
 
-        btnSelectFile = QtWidgets.QPushButton('Select .tnt file(s)', self)
-        btnSelectFile.setGeometry(QtCore.QRect(40,150,180,30))
-        btnSelectFile.clicked.connect(self.browse)
+        self.btnSelectFile = QtWidgets.QPushButton('Select .tnt file(s)', self)
+        self.btnSelectFile.setGeometry(QtCore.QRect(40,150,180,30))
+        self.btnSelectFile.clicked.connect(self.browse)
 
         self.checkMergeFiles = QtWidgets.QCheckBox('Merge', self)
         self.checkMergeFiles.setGeometry(QtCore.QRect(240,150,180,30))
 
+        self.progress = QtWidgets.QProgressBar(self)
+        self.progress.setGeometry(QtCore.QRect(20,190,220,25))
+        self.progress.setValue(0)
+
+        self.btnCancel = QtWidgets.QPushButton('Cancel', self)
+        self.btnCancel.setGeometry(QtCore.QRect(250,190,70,25))
+        self.btnCancel.setEnabled(False)
+        self.btnCancel.clicked.connect(self.cancel)
+
+        # preview of the selected file, drawn by a worker thread
+        self.preview = QtWidgets.QLabel('Select a translated file to preview', self)
+        self.preview.setGeometry(QtCore.QRect(340,20,400,160))
+        self.preview.setAlignment(QtCore.Qt.AlignCenter)
+        self.preview.setFrameShape(QtWidgets.QFrame.StyledPanel)
+
+        self.slider = QtWidgets.QSlider(QtCore.Qt.Horizontal, self)
+        self.slider.setGeometry(QtCore.QRect(340,190,400,25))
+        self.slider.setEnabled(False)
+        self.slider.valueChanged.connect(self.request_preview)
+
+        # one preview at a time, only the latest request is drawn
+        self.previewPool = QtCore.QThreadPool(self)
+        self.previewPool.setMaxThreadCount(1)
+        self.previewFile = None
+        self.previewRequest = 0
+
+        # independent files are translated concurrently
+        self.pool = QtCore.QThreadPool(self)
+        self.cancelled = False
         self.files = []
+        self.results = dict()
+        self.translated = 0
+        self.failed = 0
 
     def browse(self):
-        self.statusBar().setStyleSheet("QStatusBar{padding-left:8px;background:rgba(255,0,0,255);color:black;font-weight:bold;}")
-        self.statusBar().showMessage('Translating...')
-        i = -1 # Number of files
-        self.files = QtWidgets.QFileDialog.getOpenFileNames(self, 'Select file(s) to translate', filter='*.tnt')[0]
+        files = QtWidgets.QFileDialog.getOpenFileNames(self, 'Select file(s) to translate', filter='*.tnt')[0]
+        if not files:
+            return
+        self.files = files
+        self.results = dict()
+        self.translated = 0
+        self.failed = 0
+        self.cancelled = False
+        self.merge = self.checkMergeFiles.isChecked()
         self.list.clear()
-        #try:
+        self.progress.setRange(0, len(self.files))
+        self.progress.setValue(0)
+        self.btnSelectFile.setEnabled(False)
+        self.btnCancel.setEnabled(True)
+        self.statusBar().setStyleSheet(RED)
+        self.statusBar().showMessage('Translating...')
+
         for i, file in enumerate(self.files):
-            measurements, scans, data = self.translate(file)
-            self.list.addItem(file)
-            if self.checkMergeFiles.isChecked():
-                if not i: # if translating a new file initialize variables
-                    self.merged_scans = scans
-                    self.merged_measurements = measurements
-                    self.merged_data = data
-                else:
-                    # check if the number of measurements is the same
-                    if self.merged_measurements == measurements:
-                        self.merged_scans += scans
-                        self.merged_data += data
-                    else:
-                        raise Exception()
-        if self.checkMergeFiles.isChecked():
-            # header is taken from the first file
-            self.translate(self.files[0], merged = True)
-        #except:
-        #    QtWidgets.QMessageBox.critical(self, "Critical error", "Unsupported file or merge error. {} file(s) translated.".format(i) , QtWidgets.QMessageBox.Ok)
-        #    i-=1
-        self.statusBar().setStyleSheet("QStatusBar{padding-left:8px;background:rgba(0,255,0,255);color:black;font-weight:bold;}")
-        self.statusBar().showMessage('{} file(s) translated!'.format(i+1))
-
-
-    def translate(self, file, merged = False):
-        tnt = TNTReader(file)
-        if not merged:
-            file_name = file.replace('.tnt', '.dat')
+            worker = Worker(i, self.is_cancelled, self.translate, file)
+            worker.signals.finished.connect(self.file_finished)
+            self.pool.start(worker)
+
+    def cancel(self):
+        # running translations are finished, files still waiting in the pool are skipped
+        self.cancelled = True
+        self.btnCancel.setEnabled(False)
+        self.statusBar().showMessage('Cancelling...')
+
+    def is_cancelled(self):
+        return self.cancelled
+
+    def file_finished(self, index, result, error):
+        # called in the GUI thread for every file
+        file = self.files[index]
+        if error:
+            self.failed += error != 'cancelled'
+            item = QtWidgets.QListWidgetItem('{} - {}'.format(file, error))
         else:
-            file_name = file.replace('.tnt', '_merged.dat')
-            
-        with open(file_name, 'w') as output:
-            # header, comments and details
-            output.write('%%\nPython translator\nFile translated from Tecmag spectrometer (TNT format)\n%End%\n\n')
-            output.write('%Program Comments%\n')
-            output.write('Repeat times: {}\n%End%\n\n'.format(int(tnt.params['repeat_times'])))
-            output.write('%Pulse Program%\nPulse prog details\n%End%\n\n')
-        
-            # PhaseList
-            output.write('%Phase Lists%\nTl1\nTl2\nTl3\nRl1\nRl2\n%End%\n\n')
-        
-            # Number of skipped transfers
-            output.write('%nb of skipped transfers%\n0\n%End%\n\n')
-        
-            # Loops
-            output.write('%loops%\n1\t0\n1\t0\n%End%\n\n')
-        
-            # Delays
-            output.write('%Delays%\n')
-            for i, key in enumerate(list(tnt.params['Parameters'].keys())):
-                output.write('{}\t{}\t0\n'.format(key, tnt.params['Parameters'][key]['Value']))
-            output.write('%End%\n\n')
-        
-            # Parameters
-            output.write('%Parameters%\n')
-            output.write('Frequency\t{0:.6f} MHz\t{1}\n'.format(tnt.params['ob_freq'][0], tnt.params['obs_channel']))
-            output.write('Field\t{0:.5f} T\t0\n'.format(tnt.params['magnet_field']))
-            output.write('DW\t{0:.3f} us\t0\n'.format(float(tnt.params['dwell'][0])*10**6))
-            output.write('Sensitivity\t? V\t0\n')
-            output.write('Scans\t{}\t0\n'.format(int(tnt.params['scans'])))
-            output.write('Transfer\t{}\t0\n'.format(int(tnt.params['actual_scans'])))
-            output.write('Record size\t{}\t0\n'.format(int(tnt.params['acq_points'])))
-            output.write('Power\t0 dB\t0\n')
-            output.write('Aux. frequency\t{0:.2f} MHz\t0\n'.format(float(tnt.params['ref_freq'])))
-            output.write('Temperature\t{0:.1f} K\t0\n'.format(int(tnt.params['actual_temperature'])))
-            output.write('%End%\n\n')
-        
-            # Variables
-            # Identify a type of measurement
-            typ = ''
-            for i in range(tnt.params['NCols']):
-                if tnt.params['Sequence']['F1_Freq'][i][3] != '':
-                    typ = 'fsw'
-                    table = tnt.params['Sequence']['F1_Freq'][i][3] # index [3] is a 2D table
-                    break
-                elif tnt.params['Sequence']['F1_Atten'][i][3] != '':
-                    typ = 'att'
-                    table = tnt.params['Sequence']['F1_Atten'][i][3]
-                    break
-                elif tnt.params['Sequence']['Delay'][i][3] != '':
-                    typ = 't1'
-                    table = tnt.params['Sequence']['Delay'][i][3]
-                    break
-
-            output.write('%Variables : level1%\n')
-            if typ == 'fsw' or typ == 'att':
-                output.write('Frequency\t')
-                frequencies = ['{0:.6f} MHz'.format(tnt.params['ob_freq'][0]+float(offset)/10**6) if offset != '' else '{0:.6f} MHz'.format(tnt.params['ob_freq'][0]) for offset in tnt.params['Tables'][table]]
-                output.write('\t'.join(frequencies))
-            elif typ == 't1':
-                output.write('delta\t')
-                output.write('\t'.join(list(map(lambda x: x.replace('u', ' us').replace('m', ' ms'), tnt.params['Tables'][table]))))
-            else:
-                output.write('Frequency\t')
-                output.write('{0:.6f} MHz'.format(tnt.params['ob_freq'][0]))
-            output.write('\n\tNone\n%End%\n\n')
-        
-            output.write('%Variables : level2%\n\tNone\n\tNone\n%End%\n\n')
-            output.write('%Nb max of Measurements%\n{}\n%End%\n\n'.format(tnt.data.shape[1]))
-            output.write('%Comments on experiment%\n{}\n%End%\n\n'.format(tnt.params['Comments']))
-        
-            # Data output
-            output.write('%Data%\n')
-
-            if merged:
-                data = self.merged_data
-                scans = self.merged_scans
+            self.translated += 1
+            self.results[index] = result
+            item = QtWidgets.QListWidgetItem(file)
+        # the file is previewed when the item is selected
+        item.setData(QtCore.Qt.UserRole, file)
+        self.list.addItem(item)
+        self.list.scrollToBottom()
+        self.progress.setValue(self.progress.value()+1)
+        self.statusBar().showMessage('Translating... {}/{}'.format(self.progress.value(), len(self.files)))
+
+        if self.progress.value() == len(self.files):
+            if self.merge and not self.cancelled and not self.failed:
+                self.start_merge()
             else:
-                data = np.array(tnt.data)
-                scans = int(tnt.params['actual_scans'])*int(tnt.params['repeat_times'])
-                
-            for measurement in range(data.shape[1]):
-                output.write('measure {}\n'.format(measurement+1))
-                output.write('scans {}\n'.format(scans))
-                reals = ['{0:.3E}'.format(float(np.real(data[data_point, measurement]))) for data_point in range(tnt.data.shape[0])]
-                imags = ['{0:.3E}'.format(float(np.imag(data[data_point, measurement]))) for data_point in range(tnt.data.shape[0])]
-                output.write('\t'.join(imags))
-                output.write('\n')
-                output.write('\t'.join(reals))
-                output.write('\n')
-
-            # Merging is done by a separate function once all files have been succesfully translated.
-            return (data.shape[1], scans, data)
+                self.batch_finished()
+
+    def start_merge(self):
+        # header is taken from the first file, files are summed measurement by measurement
+        tnts = [self.results[i] for i in range(len(self.files))]
+        self.results = dict()
+        self.statusBar().showMessage('Merging...')
+        worker = Worker(0, lambda: False, merge, tnts)
+        worker.signals.finished.connect(self.merge_finished)
+        self.pool.start(worker)
+
+    def merge_finished(self, index, result, error):
+        if error:
+            # MergeError lists all incompatible files
+            self.list.addItem('Merge error - {}'.format(error))
+        else:
+            self.list.addItem(result[2])
+        self.list.scrollToBottom()
+        self.failed += bool(error)
+        self.batch_finished()
+
+    def batch_finished(self):
+        self.btnSelectFile.setEnabled(True)
+        self.btnCancel.setEnabled(False)
+        self.statusBar().setStyleSheet(GREEN if not self.failed else RED)
+        if self.cancelled:
+            self.statusBar().showMessage('Cancelled, {} file(s) translated!'.format(self.translated))
+        elif self.failed:
+            self.statusBar().showMessage('{} file(s) translated, {} failed!'.format(self.translated, self.failed))
+        else:
+            self.statusBar().showMessage('{} file(s) translated!'.format(self.translated))
+        self.results = dict()
+
+    def select_preview(self, item, previous=None):
+        file = item.data(QtCore.Qt.UserRole) if item is not None else None
+        if not file:
+            return
+        self.previewFile = file
+        self.slider.blockSignals(True)
+        self.slider.setValue(0)
+        self.slider.blockSignals(False)
+        self.request_preview()
+
+    def request_preview(self, *args):
+        if self.previewFile is None:
+            return
+        self.previewRequest += 1
+        request = self.previewRequest
+        # requests overtaken by newer ones (e.g. while the slider moves) are skipped
+        worker = Worker(request, lambda: request != self.previewRequest, render_preview,
+                        self.previewFile, self.slider.value(), self.preview.width(), self.preview.height())
+        worker.signals.finished.connect(self.preview_finished)
+        self.previewPool.start(worker)
+
+    def preview_finished(self, index, result, error):
+        if index != self.previewRequest or error == 'cancelled':
+            return
+        if error:
+            self.preview.setText(error)
+            self.slider.setEnabled(False)
+            return
+        image, measurements, measurement = result
+        self.preview.setPixmap(QtGui.QPixmap.fromImage(image))
+        self.slider.blockSignals(True)
+        self.slider.setRange(0, measurements-1)
+        self.slider.setValue(measurement)
+        self.slider.blockSignals(False)
+        self.slider.setEnabled(measurements > 1)
+
+    def translate(self, file):
+        # the opened file is kept for merging
+        tnt = TNTReader(file)
+        translate(tnt)
+        return tnt
 
 if __name__ == '__main__':
     if not QApplication.instance():
@@ -0,0 +1,285 @@
+"""
+Merging (summing) of several Tecmag .tnt (or already translated .dat) files into one Grenoble .dat file,
+and stitching of frequency sweeps with different frequency tables.
+"""
+
+__author__ = "ijakovac@phy.hr"
+
+import itertools
+import os
+import tempfile
+
+import numpy as np
+
+from tecmag import TNTReader
+from datfile import (write_header, write_data, format_measurement, read_header, iter_measurements, open_dat, columns,
+                     dat_name, check_output, MEMORY)
+
+class MergeError(ValueError):
+    """
+    Files can't be merged. incompatible is a list of (file, reason) pairs.
+    """
+    def __init__(self, incompatible):
+        self.incompatible = incompatible
+        super(MergeError, self).__init__('; '.join('{}: {}'.format(file, reason) for file, reason in incompatible))
+
+def _measurements(shape):
+    # e.g. '20' for 2D data, '20x3' for 3D data
+    dims = list(shape[1:])
+    while len(dims) > 1 and dims[-1] == 1:
+        dims.pop()
+    return 'x'.join(str(dim) for dim in dims)
+
+def incompatible_files(tnts):
+    """
+    List files that can't be merged with the first file.
+
+    Returns
+    -------
+    incompatible : list
+        (file, reason) pairs
+
+    """
+    first = tnts[0].data.shape
+    incompatible = []
+    for tnt in tnts[1:]:
+        shape = tnt.data.shape
+        if shape[1:] != first[1:]:
+            incompatible.append((tnt.filename, '{} measurements instead of {}'.format(_measurements(shape), _measurements(first))))
+        elif shape[0] != first[0]:
+            incompatible.append((tnt.filename, '{} points instead of {}'.format(shape[0], first[0])))
+    return incompatible
+
+def merge(files, file_name=None, dtype=np.complex64, accumulator='memory', compresslevel=None):
+    """
+    Sum the data of several files and write them to a single .dat file.
+
+    The header is taken from the first file.
+
+    Parameters
+    ----------
+    files : list
+        Names of .tnt files (or already opened TNTReaders)
+    file_name : str
+        Name of .dat file to write to (default: first file with _merged.dat extension)
+    dtype : dtype
+        Accumulator type, np.complex128 sums in double precision
+    accumulator : str
+        'memory' sums one measurement of all files at a time (all files are open at once),
+        'disk' sums one file at a time into a temporary memory-mapped file
+    compresslevel : int
+        Compress the .dat file with gzip (see datfile.open_dat)
+
+    Returns
+    -------
+    measurements : int
+        Number of measurements
+    scans : int
+        Number of scans
+    file_name : str
+        Name of the merged .dat file
+
+    """
+    tnts = [file if isinstance(file, TNTReader) else TNTReader(file) for file in files]
+    incompatible = incompatible_files(tnts)
+    if incompatible:
+        raise MergeError(incompatible)
+    if file_name is None:
+        file_name = dat_name(tnts[0].filename, compresslevel, '_merged')
+    check_output(file_name, [tnt.filename for tnt in tnts])
+    scans = sum(tnt.accumulated_scans() for tnt in tnts)
+    # measurements of all planes of 3D and 4D data
+    planes = [columns(tnt.data) for tnt in tnts]
+    points, measurements = planes[0].shape
+
+    with open_dat(file_name, 'w', compresslevel) as output:
+        write_header(output, tnts[0])
+        if accumulator == 'memory':
+            merged = np.empty(points, dtype)
+            for measurement in range(measurements):
+                merged[:] = planes[0][:, measurement]
+                for plane in planes[1:]:
+                    merged += plane[:, measurement]
+                output.write(format_measurement(merged, measurement+1, scans))
+        elif accumulator == 'disk':
+            with tempfile.TemporaryFile() as temp:
+                merged = np.memmap(temp, dtype, mode='w+', shape=(points, measurements), order='F')
+                for measurement in range(measurements):
+                    merged[:, measurement] = planes[0][:, measurement]
+                for plane in planes[1:]:
+                    for measurement in range(measurements):
+                        merged[:, measurement] += plane[:, measurement]
+                write_data(output, merged, scans)
+                del merged
+        else:
+            raise ValueError("Unknown accumulator '{}'".format(accumulator))
+
+    return (measurements, scans, file_name)
+
+def merge_dat(files, file_name=None, dtype=np.complex64, compresslevel=None):
+    """
+    Sum several .dat files into a single .dat file.
+
+    The header is copied from the first file. All files are read in parallel,
+    one measurement at a time, so memory doesn't depend on file size.
+
+    Parameters
+    ----------
+    files : list
+        Names of .dat files (plain or gzip compressed)
+    file_name : str
+        Name of .dat file to write to (default: first file with _merged.dat extension)
+    dtype : dtype
+        Accumulator type, np.complex128 sums in double precision
+    compresslevel : int
+        Compress the .dat file with gzip (see datfile.open_dat)
+
+    Returns
+    -------
+    measurements : int
+        Number of measurements
+    scans : int
+        Number of scans (of the last measurement)
+    file_name : str
+        Name of the merged .dat file
+
+    """
+    if file_name is None:
+        base = files[0][:-3] if files[0].lower().endswith('.gz') else files[0]
+        file_name = dat_name(base, compresslevel, '_merged', '.dat')
+    check_output(file_name, files)
+    inputs = [open_dat(file) for file in files]
+    try:
+        headers = [read_header(input) for input in inputs]
+        counts = [sections.get('Nb max of Measurements', ['?'])[:1] for sections, _ in headers]
+        incompatible = [(file, 'number of measurements {} != {}'.format(count[0], counts[0][0]))
+                        for file, count in zip(files[1:], counts[1:]) if count != counts[0]]
+        if incompatible:
+            raise MergeError(incompatible)
+
+        measurements = scans = 0
+        try:
+            with open_dat(file_name, 'w', compresslevel) as output:
+                output.write(headers[0][1])
+                for blocks in itertools.zip_longest(*[iter_measurements(input, dtype) for input in inputs]):
+                    if any(block is None for block in blocks):
+                        raise MergeError([(file, 'only {} measurements'.format(measurements))
+                                          for file, block in zip(files, blocks) if block is None])
+                    points = [len(column) for _, _, column in blocks]
+                    if len(set(points)) > 1:
+                        raise MergeError([(file, 'number of points {} != {}'.format(count, points[0]))
+                                          for file, count in zip(files[1:], points[1:]) if count != points[0]])
+                    merged = blocks[0][2]
+                    for _, _, column in blocks[1:]:
+                        merged += column
+                    scans = sum(scan for _, scan, _ in blocks)
+                    measurements += 1
+                    output.write(format_measurement(merged, blocks[0][0], scans))
+            if counts[0] and counts[0][0].strip().isdigit() and int(counts[0][0]) != measurements:
+                raise MergeError([(file, '{} measurements, header says {}'.format(measurements, counts[0][0].strip()))
+                                  for file in files])
+        except MergeError:
+            # no truncated merged file is left behind
+            os.remove(file_name)
+            raise
+    finally:
+        for input in inputs:
+            input.close()
+
+    return (measurements, scans, file_name)
+
+def sweep_frequencies(tnt):
+    """
+    Frequencies (MHz) of the measurements of a frequency sweep: ob_freq plus the F1_Freq offsets.
+
+    Raises MergeError if the file isn't a frequency sweep.
+    """
+    typ, table = tnt.experiment_type()
+    if typ != 'fsw':
+        raise MergeError([(tnt.filename, 'not a frequency sweep')])
+    measurements = tnt.data.shape[1]
+    offsets = np.nan_to_num(tnt.tables[table][0][:measurements])
+    if len(offsets) < measurements:
+        raise MergeError([(tnt.filename, 'frequency table shorter than {} measurements'.format(measurements))])
+    return tnt.params['ob_freq'][0] + offsets/10**6
+
+def stitch(files, file_name=None, resolution=1.0, memory=MEMORY, compresslevel=None):
+    """
+    Merge frequency sweeps into one sweep on the union of their frequencies.
+
+    Measurements at the same frequency (within resolution) are combined by
+    scan-weighted averaging: sum(scans*data)/sum(scans), written with the sum
+    of scans. All other measurements are placed in the order of frequency.
+    The header is taken from the first file. Only the first plane is used.
+
+    Parameters
+    ----------
+    files : list
+        Names of .tnt files (or already opened TNTReaders) of frequency sweeps
+    file_name : str
+        Name of .dat file to write to (default: first file with _stitched.dat extension)
+    resolution : float
+        Frequencies closer than resolution (Hz) coincide
+    memory : int
+        Memory budget (bytes) for a block of stitched frequencies and the data read for it
+    compresslevel : int
+        Compress the .dat file with gzip (see datfile.open_dat)
+
+    Returns
+    -------
+    measurements : int
+        Number of measurements (frequencies)
+    scans : ndarray
+        Number of scans of each measurement
+    file_name : str
+        Name of the stitched .dat file
+
+    """
+    tnts = [file if isinstance(file, TNTReader) else TNTReader(file) for file in files]
+    points = tnts[0].data.shape[0]
+    incompatible = [(tnt.filename, '{} points instead of {}'.format(tnt.data.shape[0], points))
+                    for tnt in tnts[1:] if tnt.data.shape[0] != points]
+    if incompatible:
+        raise MergeError(incompatible)
+    if file_name is None:
+        file_name = dat_name(tnts[0].filename, compresslevel, '_stitched')
+    check_output(file_name, [tnt.filename for tnt in tnts])
+
+    frequencies = []
+    for tnt in tnts:
+        try:
+            frequencies.append(sweep_frequencies(tnt))
+        except MergeError as err:
+            incompatible.extend(err.incompatible)
+    if incompatible:
+        raise MergeError(incompatible)
+
+    # sorted union of all frequencies, index of every measurement of every file in it
+    keys = np.round(np.concatenate(frequencies)*1e6/resolution).astype(np.int64)
+    union, first, index = np.unique(keys, return_index=True, return_inverse=True)
+    weights = np.concatenate([np.full(len(f), tnt.accumulated_scans(), dtype=np.float64)
+                              for tnt, f in zip(tnts, frequencies)])
+    scans = np.bincount(index, weights=weights, minlength=len(union))
+
+    # position of the measurements of each file in the union
+    positions = np.split(index, np.cumsum([len(f) for f in frequencies])[:-1])
+
+    with open_dat(file_name, 'w', compresslevel) as output:
+        write_header(output, tnts[0], frequencies=np.concatenate(frequencies)[first])
+        # the union is written in blocks of frequencies, memory doesn't grow with the number of frequencies
+        chunk = max(1, memory // (points*16*2))
+        for start in range(0, len(union), chunk):
+            stop = min(start+chunk, len(union))
+            merged = np.zeros((points, stop-start), np.complex128)
+            for tnt, position in zip(tnts, positions):
+                # only the measurements of this block are read from the memory-mapped file
+                selected = np.flatnonzero((position >= start) & (position < stop))
+                if len(selected):
+                    block = tnt.view()[:, selected]*float(tnt.accumulated_scans())
+                    # add.at also adds repeated frequencies of one file
+                    np.add.at(merged.T, position[selected]-start, block.T)
+            merged /= scans[start:stop]
+            for measurement in range(start, stop):
+                output.write(format_measurement(merged[:, measurement-start], measurement+1, int(scans[measurement])))
+
+    return (len(union), scans.astype(int), file_name)
@@ -0,0 +1,67 @@
+"""
+Downsampling of Tecmag .tnt data for plotting previews.
+
+Only the previewed measurement is read from the memory-mapped file.
+"""
+
+__author__ = "ijakovac@phy.hr"
+
+import functools
+
+import numpy as np
+
+from tecmag import TNTReader
+
+def minmax(values, buckets):
+    """
+    Minimum and maximum of values in each of (at most) buckets equal parts.
+
+    Drawing a vertical line from minimum to maximum in each pixel column shows
+    the same picture as drawing all points, including single-point spikes.
+
+    Returns
+    -------
+    low, high : ndarray
+        Arrays of length min(buckets, len(values))
+
+    """
+    buckets = max(1, min(buckets, len(values)))
+    starts = (np.arange(buckets)*len(values)) // buckets
+    return np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts)
+
+@functools.lru_cache(maxsize=4)
+def open_reader(filename):
+    # preview readers are kept open while the user switches between files and measurements
+    return TNTReader(filename, header_only=True)
+
+def preview(filename, measurement=0, buckets=1000):
+    """
+    Downsampled real and imaginary part of one measurement.
+
+    Parameters
+    ----------
+    filename : str
+        Name of .tnt file
+    measurement : int
+        Measurement (counted from 0), limited to the number of measurements
+    buckets : int
+        Number of points of the downsampled data (e.g. the width of the plot in pixels)
+
+    Returns
+    -------
+    data : dict
+        measurements (number of measurements), measurement, points (number of
+        points), real and imag ((low, high) pairs, see minmax), limits (minimum
+        and maximum of both)
+
+    """
+    tnt = open_reader(filename)
+    measurements = int(tnt.tmag['actual_npts'][1])
+    measurement = min(max(0, measurement), measurements-1)
+    # one measurement is a contiguous part of the file
+    column = np.asarray(tnt.view(measurement)[:, 0])
+    real, imag = minmax(column.real, buckets), minmax(column.imag, buckets)
+    low = min(real[0].min(), imag[0].min()) if len(column) else 0.0
+    high = max(real[1].max(), imag[1].max()) if len(column) else 0.0
+    return {'measurements': measurements, 'measurement': measurement, 'points': len(column),
+            'real': real, 'imag': imag, 'limits': (float(low), float(high))}
@@ -0,0 +1,205 @@
+"""
+Processing of Tecmag .tnt files into spectra: shift, apodization, zero-fill, FFT and phase correction.
+
+All measurements of a file are processed at once along the first axis, with
+the processing parameters stored by TNMR in the TMG2 section:
+    python processing.py [--zero-fill N] [--lb HZ] [--gb HZ] [--band MIN MAX] file.tnt [...]
+"""
+
+__author__ = "ijakovac@phy.hr"
+
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from tecmag import TNTReader
+from datfile import MEMORY
+
+def settings(tnt, **overrides):
+    """
+    Processing parameters stored in the file, optionally overridden.
+
+    Returns
+    -------
+    settings : dict
+        shift (points removed from the start, negative adds zeros), linebrd and
+        gaussbrd (Hz), phase0 and phase1 (degrees), zero_fill (number of points
+        of the spectrum) and dwell (s)
+
+    """
+    params = tnt.params
+    npts = int(tnt.tmag['actual_npts'][0])
+    result = {'shift': int(params['data_shift_points']), 'linebrd': float(params['linebrd'][0]),
+              'gaussbrd': float(params['gaussbrd'][0]), 'phase0': float(params['cumm_0_phase'][0]),
+              'phase1': float(params['cumm_1_phase'][0]), 'zero_fill': 1 << max(0, npts-1).bit_length(),
+              'dwell': float(params['dwell'][0])}
+    if overrides.pop('echo', False):
+        # spectra of echoes start at the top of the echo
+        result['shift'] = int(params['echo_center'][0])
+    result.update((key, value) for key, value in overrides.items() if value is not None)
+    return result
+
+def window(points, dwell, linebrd=0.0, gaussbrd=0.0):
+    """
+    Apodization function: exponential (linebrd) and Gaussian (gaussbrd) line broadening in Hz.
+    """
+    t = np.arange(points)*dwell
+    return np.exp(-np.pi*linebrd*t - (np.pi*gaussbrd*t)**2/(4*np.log(2)))
+
+def frequencies(zero_fill, dwell):
+    """
+    Frequency offsets (Hz) of the spectrum points, in increasing order.
+    """
+    return np.fft.fftshift(np.fft.fftfreq(zero_fill, dwell))
+
+def spectra(fids, shift=0, linebrd=0.0, gaussbrd=0.0, phase0=0.0, phase1=0.0, zero_fill=None, dwell=1.0):
+    """
+    Process a block of FIDs into spectra.
+
+    Parameters
+    ----------
+    fids : ndarray
+        Complex array of shape (points, measurements)
+    shift : int
+        Points removed from the start (negative: zeros added)
+    linebrd, gaussbrd : float
+        Exponential and Gaussian line broadening (Hz)
+    phase0 : float
+        Zero order phase (degrees)
+    phase1 : float
+        First order phase (degrees across the spectral width, zero at the center)
+    zero_fill : int
+        Number of points of the spectrum (default: number of points)
+    dwell : float
+        Dwell time (s)
+
+    Returns
+    -------
+    spectra : ndarray
+        Complex array of shape (zero_fill, measurements), see frequencies() for the axis
+
+    """
+    if shift > 0:
+        fids = fids[shift:]
+    elif shift < 0:
+        fids = np.concatenate([np.zeros((-shift,) + fids.shape[1:], fids.dtype), fids])
+    zero_fill = zero_fill or fids.shape[0]
+    fids = fids[:zero_fill]*window(min(fids.shape[0], zero_fill), dwell, linebrd, gaussbrd)[:, None]
+    spectra = np.fft.fftshift(np.fft.fft(fids, n=zero_fill, axis=0), axes=0)
+    phase = np.deg2rad(phase0 + phase1*(np.arange(zero_fill)/zero_fill - 0.5))
+    spectra *= np.exp(1j*phase)[:, None]
+    return spectra
+
+def intensities(spectra, frequencies, band=None):
+    """
+    Integrated real part of each spectrum (e.g. the envelope of a frequency sweep).
+
+    Parameters
+    ----------
+    band : tuple
+        (minimum, maximum) frequency offset (Hz) to integrate over (default: whole spectrum)
+
+    """
+    if band is not None:
+        spectra = spectra[(frequencies >= band[0]) & (frequencies <= band[1])]
+    step = abs(frequencies[1] - frequencies[0]) if len(frequencies) > 1 else 1.0
+    return spectra.real.sum(axis=0)*step
+
+def measurement_axis(tnt):
+    """
+    Values of the swept variable of each measurement and their unit.
+
+    Frequency sweeps give the frequency in MHz, other experiments the decoded
+    2D table (see TNTReader.tables) or measurement numbers.
+    """
+    measurements = tnt.data.shape[1]
+    typ, table = tnt.experiment_type()
+    if table is not None and table in tnt.tables:
+        values, unit = tnt.tables[table]
+        values = np.resize(values, measurements)
+        if typ == 'fsw':
+            return float(tnt.params['ob_freq'][0]) + np.nan_to_num(values)/10**6, 'MHz'
+        return values, unit
+    return np.arange(1, measurements+1, dtype=np.float64), ''
+
+def export_spectra(file, base_name=None, band=None, memory=MEMORY, **overrides):
+    """
+    Process all measurements of a .tnt file and write the spectra and their intensities.
+
+    Writes base_name_spectra.npy (complex64, shape (zero_fill, measurements)),
+    base_name_spectra.json (processing parameters and frequency axis) and
+    base_name_envelope.dat (tab separated swept variable and intensity).
+
+    Parameters
+    ----------
+    file : str or TNTReader
+        Name of .tnt file (or already opened file) to read from
+    base_name : str
+        Name of the output files without the suffix (default: file without .tnt)
+    band : tuple
+        (minimum, maximum) frequency offset (Hz) of the integrated intensity
+    memory : int
+        Memory budget (bytes) for data processed at once
+    overrides
+        Processing parameters replacing the stored ones (see settings)
+
+    Returns
+    -------
+    envelope : ndarray
+        Integrated intensity of each measurement
+
+    """
+    tnt = file if isinstance(file, TNTReader) else TNTReader(file)
+    if base_name is None:
+        base_name = tnt.filename[:-4] if tnt.filename.endswith('.tnt') else tnt.filename
+    options = settings(tnt, **overrides)
+    axis = frequencies(options['zero_fill'], options['dwell'])
+    measurements = tnt.data.shape[1]
+
+    output = np.lib.format.open_memmap(base_name + '_spectra.npy', mode='w+', dtype=np.complex64,
+                                       shape=(options['zero_fill'], measurements), fortran_order=True)
+    envelope = np.empty(measurements)
+    # spectra take more memory than the data (zero-fill, complex128)
+    chunk = max(1, memory // (options['zero_fill']*16*2))
+    for start in range(0, measurements, chunk):
+        stop = min(start+chunk, measurements)
+        block = spectra(tnt.read_measurements(start, stop), **options)
+        output[:, start:stop] = block
+        envelope[start:stop] = intensities(block, axis, band)
+    output.flush()
+    del output
+
+    values, unit = measurement_axis(tnt)
+    with open(base_name + '_spectra.json', 'w') as f:
+        json.dump({'source': tnt.filename, 'settings': options, 'band': band,
+                   'frequency_start': float(axis[0]), 'frequency_step': float(axis[1] - axis[0]) if len(axis) > 1 else 0.0,
+                   'ob_freq': float(tnt.params['ob_freq'][0]), 'measurement_unit': unit}, f, indent=1)
+    with open(base_name + '_envelope.dat', 'w') as f:
+        f.write('{}\tintensity\n'.format(unit or 'measurement'))
+        np.savetxt(f, np.column_stack([values, envelope]), fmt='%.6f\t%.6E')
+    return envelope
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Process .tnt files into spectra and intensities.')
+    parser.add_argument('files', nargs='+', help='.tnt files')
+    parser.add_argument('--zero-fill', type=int, default=None, metavar='N', help='points of the spectrum')
+    parser.add_argument('--shift', type=int, default=None, metavar='N', help='points removed from the start')
+    parser.add_argument('--echo', action='store_true', help='start at the echo center')
+    parser.add_argument('--lb', type=float, default=None, metavar='HZ', help='exponential line broadening')
+    parser.add_argument('--gb', type=float, default=None, metavar='HZ', help='Gaussian line broadening')
+    parser.add_argument('--phase0', type=float, default=None, metavar='DEG', help='zero order phase')
+    parser.add_argument('--phase1', type=float, default=None, metavar='DEG', help='first order phase')
+    parser.add_argument('--band', nargs=2, type=float, default=None, metavar=('MIN', 'MAX'),
+                        help='frequency offsets (Hz) of the integrated intensity')
+    args = parser.parse_args(argv)
+
+    for file in args.files:
+        export_spectra(file, band=args.band, zero_fill=args.zero_fill, shift=args.shift, echo=args.echo,
+                       linebrd=args.lb, gaussbrd=args.gb, phase0=args.phase0, phase1=args.phase1)
+        print('OK      {}'.format(file))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
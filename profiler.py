@@ -0,0 +1,59 @@
+"""
+Lightweight per-stage timing of reading and translating .tnt files.
+"""
+
+__author__ = "ijakovac@phy.hr"
+
+import contextlib
+import json
+import os
+import time
+
+class Profile():
+    """
+    Wall time per stage and bytes read/written for one file.
+
+    Stages used by TNTReader and translate:
+        cache, scan, pseq_read, memmap, header, read, format, wait (for blocks formatted by
+        other processes), write, binary, spectra
+
+    """
+    def __init__(self, file):
+        self.file = file
+        self.start = time.perf_counter()
+        self.stages = dict()
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def record(self):
+        """
+        Results as a dictionary (times in seconds).
+        """
+        return {'file': self.file, 'pid': os.getpid(), 'total': time.perf_counter() - self.start,
+                'stages': self.stages, 'bytes_read': self.bytes_read, 'bytes_written': self.bytes_written}
+
+    def json(self):
+        return json.dumps(self.record())
+
+class NullProfile():
+    """
+    Profile that records nothing (used when profiling is off).
+    """
+    bytes_read = 0
+    bytes_written = 0
+
+    def stage(self, name):
+        return contextlib.nullcontext()
+
+    def __setattr__(self, name, value):
+        pass
+
+NULL_PROFILE = NullProfile()
@@ -17,19 +17,101 @@ This file was modified to read Sequence part of .tnt file (PSEQ tag).
 
 """
 
+import collections
+import functools
 import re
-import io
+import os
+import struct
+import sys
 
 import numpy as np
 
-class BytesIO2(io.BytesIO):
-    # upgrade to standard io.BytesIO class to read strings with preceding UInt32 lengths
-    def __init__(self):
-        super()
+from profiler import NULL_PROFILE
+
+# 'ansi' codec (Windows code page) exists only on Windows
+ANSI = 'ansi' if sys.platform == 'win32' else 'cp1252'
+
+UINT32 = struct.Struct('<I')
+
+# SI prefixes of TNMR values, e.g. '10u' (10 us), '3m' (3 ms), '2k' (2 kHz)
+PREFIXES = {'p': -12, 'n': -9, 'u': -6, 'm': -3, '': 0, 'k': 3, 'K': 3, 'M': 6, 'G': 9}
+VALUE_RE = re.compile(r'^\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([a-zA-Z]*)\s*$')
+
+# sequence rows with 2D tables: (row, experiment type, unit of the table)
+TABLE_ROWS = (('F1_Freq', 'fsw', 'Hz'), ('F1_Atten', 'att', 'dB'), ('Delay', 't1', 's'))
+
+# layout of the PSEQ section following the sequence rows:
+#   table_blanks - blank bytes before N and N*4 blank bytes preceding the number of tables (None: no blank space)
+#   table_trailer - bytes skipped after each table
+#   parameters - sequence parameters preceded by 1, 'Sequence' and N parameter names ('tagged'),
+#                by 4 blank bytes ('blank') or by nothing ('')
+PSeqLayout = collections.namedtuple('PSeqLayout', ['table_blanks', 'table_trailer', 'parameters'])
+
+# layouts by TNMR version, built once; older versions use LEGACY_LAYOUT
+# Old TNMR has integer N followed by N tables
+# TNT1.003 to TNT1.007 versions have 128 blanks than N followed by N*4 bytes of blank space before integer number of tables
+# TNT1.008 version has integer N followed by N*4 bytes of blank space before integer number of tables
+PSEQ_LAYOUTS = {'TNT1.003': PSeqLayout(128, 4, 'tagged')}
+PSEQ_LAYOUTS.update((version, PSeqLayout(128, 12, 'tagged')) for version in ('TNT1.004', 'TNT1.005', 'TNT1.006', 'TNT1.007'))
+PSEQ_LAYOUTS['TNT1.008'] = PSeqLayout(0, 12, 'blank')
+LEGACY_LAYOUT = PSeqLayout(None, 12, '')
+
+# UInt32 1 and the 'Sequence' string preceding the parameters in the tagged layout
+SEQUENCE_TAG = UINT32.pack(1) + UINT32.pack(8) + b'Sequence'
+
+# blank bytes between the last sequence parameter and the 'CMNT' tag
+COMMENT_GAP = 8
+
+class PSEQError(ValueError):
+    """
+    PSEQ section that can't be parsed in the layout of its TNMR version.
+
+    Attributes
+    ----------
+    offset : int
+        Position in the PSEQ section where parsing failed
+    """
+    def __init__(self, reason, offset):
+        super(PSEQError, self).__init__('{} (at offset {} of the PSEQ section)'.format(reason, offset))
+        self.reason = reason
+        self.offset = offset
+
+class Cursor():
+    # reads UInt32 numbers and strings with preceding UInt32 lengths straight from a buffer (no copies)
+    def __init__(self, data):
+        self.view = memoryview(data)
+        self.position = 0
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=0):
+        self.position = offset + (self.position if whence == 1 else 0)
+
+    def read_uint(self):
+        value, = UINT32.unpack_from(self.view, self.position)
+        self.position += 4
+        return value
 
     def read_string(self):
-        length = np.frombuffer(self.read(4), '<u4')[0]
-        return np.frombuffer(self.read(length), 'S{}'.format(length))[0] if length else b''
+        # same result as np.frombuffer(..., 'S{length}')[0]: trailing zeros are stripped
+        start = self.position + 4
+        length, = UINT32.unpack_from(self.view, self.position)
+        if start + length > len(self.view):
+            # position is left at the length, where parsing failed
+            raise ValueError('String of length {} at offset {} exceeds the buffer'.format(length, start))
+        self.position = start + length
+        if not length:
+            return b''
+        return self.view[start:self.position].tobytes().rstrip(b'\0')
+
+    def read_strings(self, count, gap=0):
+        # count decoded strings, each followed by gap bytes
+        strings = []
+        for _ in range(count):
+            strings.append(self.read_string().decode())
+            self.position += gap
+        return strings
 
 class TNTReader():
 
@@ -252,7 +334,10 @@ class TNTReader():
     ])
 
 
-    def __init__(self, filename):
+    # sections parsed for the parameters; all other sections (DATA) are only located
+    HEADER_SECTIONS = ('TMAG', 'TMG2', 'PSEQ')
+
+    def __init__(self, filename, header_only=False, cache=None, profile=None):
         """
         Read a Tecmag .tnt data file.
     
@@ -260,6 +345,12 @@ class TNTReader():
         ----------
         filename : str
             Name of file to read from
+        header_only : bool
+            Parse only the parameters, the data is not memory-mapped (data is None)
+        cache : MetadataCache
+            Cache of parsed headers; a cached file is not parsed again until it changes
+        profile : Profile
+            Records time of reading stages and bytes read
     
         Returns
         -------
@@ -268,10 +359,42 @@ class TNTReader():
         data : ndarray
             Array of NMR data.
     
+        """
+        self.filename = filename
+        self.profile = profile or NULL_PROFILE
+
+        state = None
+        if cache is not None:
+            with self.profile.stage('cache'):
+                stat = os.stat(filename)
+                state = cache.get(filename, stat)
+        if state is not None:
+            self.restore_header(state)
+        else:
+            self.read_header()
+            if cache is not None:
+                cache.put(filename, self.header_state(), stat)
+
+        self.data = None
+        if not header_only:
+            with self.profile.stage('memmap'):
+                self.data = self.memmap()
+
+    def memmap(self):
+        """
+        Memory-mapped data of all four dimensions (nothing is read until accessed).
+        """
+        data = np.memmap(self.filename, np.dtype('<c8'), mode='c', offset=self.tnt_sections['DATA']['offset'],
+                         shape=self.tmag['actual_npts'].prod())
+        return np.reshape(data, self.tmag['actual_npts'], order='F')
+
+    def read_header(self):
+        """
+        Locate the sections of the file and parse TMAG, TMG2 and PSEQ into params.
         """
         self.tnt_sections = dict()
     
-        with open(filename, 'rb') as tntfile:
+        with self.profile.stage('scan'), open(self.filename, 'rb') as tntfile:
     
             # Check if .tnt file is valid
             tntmagic = np.frombuffer(tntfile.read(self.TNTMAGIC.itemsize),
@@ -279,45 +402,54 @@ class TNTReader():
 
             if not self.TNTMAGIC_RE.match(tntmagic):
                 err = ("Invalid magic number (is '%s' really TNMR file?): %s" %
-                       (filename, tntmagic))
+                       (self.filename, tntmagic))
                 raise ValueError(err)
             self.version = tntmagic.decode()    #determine .tnt file version
 
-            # Read in the section headers
+            # Read in the section headers, seek past the section data
             tnthdrbytes = tntfile.read(self.TNTTLV.itemsize)
             while(self.TNTTLV.itemsize == len(tnthdrbytes)):
                 tlv = np.frombuffer(tnthdrbytes, self.TNTTLV)[0]
-                data_length = tlv['length']
+                tag = tlv['tag'].decode()
                 hdrdict = {'offset': tntfile.tell(),
-                           'length': data_length,
+                           'length': int(tlv['length']),
                            'bool': bool(tlv['bool'])}
-                if tlv['tag'].decode() == 'PSEQ':
+                self.tnt_sections[tag] = hdrdict
+                if tag == 'PSEQ':
                     # PSEQ stucture doesn't have length parameter, so we go back 4 bytes.
-                    tntfile.seek(-4, 1)
-                    self.start = tntfile.tell()
-                    hdrdict['data'] = tntfile.read()
-                    hdrdict['length'] = len(hdrdict['data'])
+                    # It spans the rest of the file.
+                    self.start = hdrdict['offset'] - 4
+                    hdrdict['offset'] = self.start
+                    hdrdict['length'] = os.fstat(tntfile.fileno()).st_size - self.start
+                if tag in self.HEADER_SECTIONS:
+                    tntfile.seek(hdrdict['offset'])
+                    hdrdict['data'] = tntfile.read(hdrdict['length'])
+                    self.profile.bytes_read += len(hdrdict['data'])
                 else:
-                    hdrdict['data'] = tntfile.read(data_length)
-    
-    
-                self.tnt_sections[tlv['tag'].decode()] = hdrdict
+                    tntfile.seek(hdrdict['length'], 1)
+                if tag == 'PSEQ':
+                    break
                 tnthdrbytes = tntfile.read(self.TNTTLV.itemsize)
     
     
         assert(self.tnt_sections['TMAG']['length'] == self.TNTTMAG.itemsize)
-        self.tmag = np.frombuffer(self.tnt_sections['TMAG']['data'], self.TNTTMAG, count=1)[0]
+        assert(self.tnt_sections['TMG2']['length'] == self.TNTTMG2.itemsize)
+        self.read_records(self.section('TMAG'), self.section('TMG2'))
     
         assert(self.tnt_sections['DATA']['length'] == self.tmag['actual_npts'].prod() * 8)
     
-        self.data = np.memmap(filename, np.dtype('<c8'), mode='c', offset=self.tnt_sections['DATA']['offset'],
-                         shape=self.tmag['actual_npts'].prod())
-        self.data = np.reshape(self.data, self.tmag['actual_npts'], order='F')
-    
-        assert(self.tnt_sections['TMG2']['length'] == self.TNTTMG2.itemsize)
-        self.tmg2 = np.frombuffer(self.tnt_sections['TMG2']['data'], self.TNTTMG2, count=1)[0]
+        # update Sequence data
+        with self.profile.stage('pseq_read'):
+            self.sequence = self.pseq_read(self.section('PSEQ'))
+        self.params.update(self.sequence)
+
+    def read_records(self, tmag, tmg2):
+        """
+        Parse TMAG and TMG2 section bytes into params.
+        """
+        self.tmag = np.frombuffer(tmag, self.TNTTMAG, count=1)[0]
+        self.tmg2 = np.frombuffer(tmg2, self.TNTTMG2, count=1)[0]
 
-    
         self.params = dict()
         # save TMAG data into dic
         for name in self.TNTTMAG.names:
@@ -330,10 +462,63 @@ class TNTReader():
         for name in self.TNTGRIDANDAXIS.names:
             if not name.startswith('space'):
                 self.params[name] = self.tmg2['axis_set'][name]
-    
-        # update Sequence data
-        self.params.update(self.pseq_read(self.tnt_sections['PSEQ']['data']))
 
+    def header_state(self):
+        """
+        Parsed header as stored in MetadataCache.
+        """
+        # only the locations of sections are kept, TMAG and TMG2 are stored as raw bytes
+        # (rebuilding params from them is faster than unpickling NumPy values)
+        sections = {tag: {key: value for key, value in hdrdict.items() if key != 'data'}
+                    for tag, hdrdict in self.tnt_sections.items()}
+        return {'version': self.version, 'start': self.start, 'tnt_sections': sections,
+                'tmag': self.tmag.tobytes(), 'tmg2': self.tmg2.tobytes(), 'sequence': self.sequence}
+
+    def restore_header(self, state):
+        """
+        Restore the parsed header from MetadataCache.
+        """
+        self.version = state['version']
+        self.start = state['start']
+        self.tnt_sections = state['tnt_sections']
+        self.read_records(state['tmag'], state['tmg2'])
+        self.sequence = state['sequence']
+        self.params.update(self.sequence)
+
+    def section(self, tag):
+        """
+        Return the bytes of a section, reading them from the file on first access.
+        """
+        hdrdict = self.tnt_sections[tag]
+        if 'data' not in hdrdict:
+            with open(self.filename, 'rb') as tntfile:
+                tntfile.seek(hdrdict['offset'])
+                hdrdict['data'] = tntfile.read(hdrdict['length'])
+        return hdrdict['data']
+
+    def read_measurements(self, start, stop):
+        """
+        Read a range of measurements into memory.
+
+        Measurements of all planes are counted in file order (Fortran order of
+        actual_npts[1:]). Only the requested range is read from the file (the
+        memmap is not touched), so memory use doesn't grow with the file size.
+
+        Returns
+        -------
+        data : ndarray
+            Complex array of shape (points, stop-start)
+
+        """
+        npts = int(self.tmag['actual_npts'][0])
+        stop = min(stop, int(self.tmag['actual_npts'][1:].prod()))
+        if stop <= start:
+            return np.empty((npts, 0), np.dtype('<c8'))
+        with self.profile.stage('read'), open(self.filename, 'rb') as tntfile:
+            data = np.fromfile(tntfile, np.dtype('<c8'), count=npts*(stop-start),
+                               offset=self.tnt_sections['DATA']['offset'] + start*npts*8)
+        self.profile.bytes_read += data.nbytes
+        return data.reshape((npts, stop-start), order='F')
 
     def pseq_read(self, data):
         ## Read the sequence from file ##
@@ -342,12 +527,22 @@ class TNTReader():
         dic = dict()
         dic['Message'] = ""
 
-        # extract just the sequence part of .tnt file
-        binary = BytesIO2()
-        binary.write(data)
-        binary.seek(0)
+        # parse the sequence part of .tnt file in place
+        binary = Cursor(data)
+        try:
+            self.pseq_parse(data, binary, dic)
+        except struct.error as err:
+            # a number read past the end of the section
+            raise PSEQError('truncated section', binary.tell()) from err
+        except ValueError as err:
+            # misparse (wrong layout or corrupt file): counts and lengths read from the wrong place
+            raise PSEQError('{}: {}'.format(type(err).__name__, err), binary.tell()) from err
+        return dic
 
-        dic['SequenceID'] = np.frombuffer(binary.read(8), 'S8')[0].decode()
+    def pseq_parse(self, data, binary, dic):
+        # fills dic from the PSEQ section, see pseq_read
+        dic['SequenceID'] = data[:8].rstrip(b'\0').decode()
+        binary.seek(8)
         dic['File Name'] = binary.read_string()
     
         if dic['SequenceID'][:4] == '1.18':
@@ -355,54 +550,15 @@ class TNTReader():
             dic['E-mail'] = binary.read_string()
 
         binary.read_string()
-    
-        dic['NRows'] = np.frombuffer(binary.read(4), '<u4')[0]
-        dic['NCols'] = np.frombuffer(binary.read(4), '<u4')[0]
-        
-        # Read TNMR sequence and store it into dictionary
-        dic['Sequence'] = dict()
-
-        for row in range(dic['NRows']):
-            # 28 bytes of useless data
-            np.frombuffer(binary.read(self.PSEQROW.itemsize), self.PSEQROW, count = 1)[0]
-    
-            # Read row index and use the row name as a new (sub)dictionary
-            binary.read_string()
-            row_name = binary.read_string().decode()
-            dic['Sequence'][row_name] = dict()
-    
-            for column in range(dic['NCols']):
-                # Read a column value and use it as a new key to store tables.
-                col_name = binary.read_string().decode()
-                # [value, 0D-4D table names]
-                values = [col_name]
-                for dim in range(5):
-                    values.append(binary.read_string().decode())
-                    binary.seek(4,1)
-                # whitespace
-                binary.seek(16,1)
-                dic['Sequence'][row_name][column] = values
-    
-                # [Acq row, True (1) column] has some additional data
-                if row_name == 'Acq' and col_name == '1':
-                    for i in range(6):
-                        binary.read_string()
-                    binary.seek(1,1)
-        
-        # Read TNMR tables and store them into Dictionary
-        # Old TNMR has integer N followed by N tables
-        # TNT1.003 version has 128 blanks than N followed by N*4 bytes of blank space before integer number of tables
-        # TNT1.007 version has 128 blanks than N followed by N*4 bytes of blank space before integer number of tables
-        # TNT1.008 version has integer N followed by N*4 bytes of blank space before integer number of tables
-        if self.version in ['TNT1.003', 'TNT1.004', 'TNT1.005', 'TNT1.006', 'TNT1.007']:
-            binary.seek(128,1)
-            binary.seek(np.frombuffer(binary.read(4), '<u4')[0]*4,1)
-            dic['NTables'] = np.frombuffer(binary.read(4), '<u4')[0]
-        elif self.version == 'TNT1.008':
-            binary.seek(np.frombuffer(binary.read(4), '<u4')[0]*4,1)
-            dic['NTables'] = np.frombuffer(binary.read(4), '<u4')[0]
-        else:
-            dic['NTables'] = np.frombuffer(binary.read(4), '<u4')[0]
+
+        sequence_rows(binary, dic)
+
+        # Read TNMR tables and store them into Dictionary (layout depends on the version, see PSEQ_LAYOUTS)
+        layout = PSEQ_LAYOUTS.get(self.version, LEGACY_LAYOUT)
+        if layout.table_blanks is not None:
+            binary.seek(layout.table_blanks, 1)
+            binary.seek(binary.read_uint()*4, 1)
+        dic['NTables'] = binary.read_uint()
 
         # Create dictionaries to store tables
         dic['Tables'] = dict()
@@ -410,7 +566,7 @@ class TNTReader():
         dic['Unknowns'] = dict()
 
         for table in range(dic['NTables']):
-            tab_name = binary.read_string().decode('ansi')
+            tab_name = binary.read_string().decode(ANSI)
             dic['Tables'][tab_name] = [i for i in binary.read_string().decode().replace(' ','\r\n').split('\r\n')]
             if binary.read_string() == b'': # can't compare versions; exception occurs when an old file is saved by new TNMR
                 binary.seek(12,1) # 16 bytes of empty space (-4 because string already read)
@@ -421,55 +577,284 @@ class TNTReader():
                 binary.read_string() # 'Every pass'
                 binary.seek(36,1) # some data / find meaning!
                 dic['Unknowns'] = [binary.read_string() for _ in range(3)]
-                if self.version == 'TNT1.003':
-                    binary.seek(4,1) # skip 1 integer in TNT1.003 version
-                else:
-                    binary.seek(12,1) # skip 3 integers
-                    
-        # Now reading the rest of the file... version mismatch handled below!
-        checkpoint = binary.tell()
-        def version_specific_translation():
-            dic['Parameters'] = dict() # dictionary for sequence parameters                
-            if self.version in ['TNT1.003', 'TNT1.004', 'TNT1.005', 'TNT1.006', 'TNT1.007']:
-                binary.read(4)       # '1' - len of following data
-                binary.read_string() # 'Sequence' tag
-                [binary.read_string() for i in range(np.frombuffer(binary.read(4), '<u4')[0])] # names of N sequence parameters such as trig, atten,...
-            if self.version == 'TNT1.008': binary.seek(4,1) # in new version there is no 'Sequence' tag, just 4 blank spaces
-            dic['NParameters'] = np.frombuffer(binary.read(4), '<u4')[0]
-            for i in range(dic['NParameters']):
-                parameter_name = binary.read_string().decode('ansi')
-                dic['Parameters'][parameter_name] = dict()
-                dic['Parameters'][parameter_name]['Flag'] = np.frombuffer(binary.read(4), '<u4')[0]
-                dic['Parameters'][parameter_name]['Value'] = binary.read_string().decode('ansi')
-                dic['Parameters'][parameter_name]['Type'] = np.frombuffer(binary.read(4), '<u4')[0] # 6 - time, 4 - double
-                dic['Parameters'][parameter_name]['Minumum'] = binary.read_string().decode('ansi')
-                dic['Parameters'][parameter_name]['Maximum'] = binary.read_string().decode('ansi')
-                binary.seek(12,1) # blanks
-                binary.read_string() # parameter name again
-                dic['Parameters'][parameter_name]['Default'] = binary.read_string().decode('ansi')
-                binary.seek(16,1) # blanks
+                binary.seek(layout.table_trailer, 1) # 1 integer in TNT1.003 version, 3 in others
 
-        try:
-            version_specific_translation()
-        except:
-            # If old .tnt file is saved in new TNMR the version tag gets updated to 1.008
-            # but the sequence part of the file should be translated as the old one!
-            # Quick and dirty patch:
+        # If old .tnt file is saved in new TNMR the version tag gets updated to 1.008
+        # but the sequence parameters keep the old layout: the 'Sequence' tag tells them apart
+        tagged = data.startswith(SEQUENCE_TAG, binary.tell())
+        if layout.parameters == 'blank' and tagged:
             dic['Message'] = " (TNT version mismatch!)"
-            self.version='TNT1.007'
-            binary.seek(checkpoint)
-            version_specific_translation()
-
-        temp = binary.read() # read the rest of the file
-        rest = BytesIO2()
-        rest.write(temp)
-        rest.seek(temp.find(b'CMNT')+4) # find 'Comment' tag and skip it
+            self.version = 'TNT1.007'
+            layout = PSEQ_LAYOUTS[self.version]
+
+        dic['Parameters'] = dict() # dictionary for sequence parameters
+        if layout.parameters == 'tagged':
+            binary.seek(4,1)     # '1' - len of following data
+            binary.read_string() # 'Sequence' tag
+            [binary.read_string() for i in range(binary.read_uint())] # names of N sequence parameters such as trig, atten,...
+        elif layout.parameters == 'blank':
+            binary.seek(4,1) # in new version there is no 'Sequence' tag, just 4 blank spaces
+        dic['NParameters'] = binary.read_uint()
+        for i in range(dic['NParameters']):
+            parameter_name = binary.read_string().decode(ANSI)
+            dic['Parameters'][parameter_name] = dict()
+            dic['Parameters'][parameter_name]['Flag'] = binary.read_uint()
+            dic['Parameters'][parameter_name]['Value'] = binary.read_string().decode(ANSI)
+            dic['Parameters'][parameter_name]['Type'] = binary.read_uint() # 6 - time, 4 - double
+            dic['Parameters'][parameter_name]['Minumum'] = binary.read_string().decode(ANSI)
+            dic['Parameters'][parameter_name]['Maximum'] = binary.read_string().decode(ANSI)
+            binary.seek(12,1) # blanks
+            binary.read_string() # parameter name again
+            dic['Parameters'][parameter_name]['Default'] = binary.read_string().decode(ANSI)
+            binary.seek(16,1) # blanks
+
+        # 'Comment' tag follows the parameters after COMMENT_GAP bytes
+        comment = binary.tell() + COMMENT_GAP
+        if data[comment:comment+4] != b'CMNT':
+            # layouts not seen yet: search the rest of the file
+            comment = data.find(b'CMNT', binary.tell())
         dic['Comments'] = 'No comments'
-        if np.frombuffer(rest.read(4), '<u4')[0]:
-            dic['Comments'] = rest.read_string().decode('ansi')
-                                        
-        return dic
+        if comment >= 0:
+            binary.seek(comment+4)
+            if binary.read_uint():
+                dic['Comments'] = binary.read_string().decode(ANSI)
+
+    def view(self, measurements=None, points=None):
+        """
+        Part of the first 2D plane as a view of the memory-mapped file.
+
+        Nothing is copied or read until the view is accessed, and then only the
+        selected points of the selected measurements.
+
+        Parameters
+        ----------
+        measurements, points : slice, tuple or int
+            Range of measurements and points like Python slices (counted from 0),
+            a tuple is (start, stop[, step]), a step decimates; default: all
+
+        Returns
+        -------
+        data : ndarray
+            Complex array of shape (points, measurements)
+
+        """
+        data = self.data if self.data is not None else self.memmap()
+        return data[(as_slice(points), as_slice(measurements)) + (0,)*(data.ndim-2)]
+
+    def echo_window(self, width):
+        """
+        Points from echo_center-width to echo_center+width (a slice for view).
+        """
+        center = int(self.params['echo_center'][0])
+        return slice(max(0, center-width), center+width)
+
+    def accumulated_scans(self):
+        """
+        Number of scans accumulated in the data (actual scans times repeat times).
+        """
+        return int(self.params['actual_scans'])*int(self.params['repeat_times'])
+
+    def experiment_type(self, dimension=2):
+        """
+        Identify a type of measurement from the sequence 2D (or 3D) tables (see experiment_type).
+        """
+        return self.experiment_types[dimension]
+
+    @functools.cached_property
+    def experiment_types(self):
+        # {dimension: result of experiment_type} for 2D and 3D tables
+        return {dimension: experiment_type(self.params, dimension) for dimension in (2, 3)}
+
+    @functools.cached_property
+    def table_types(self):
+        # {table name: (experiment type, unit)} of 2D and 3D tables used in sequence rows
+        types = dict()
+        for row, typ, unit in TABLE_ROWS:
+            for values in self.params['Sequence'].get(row, dict()).values():
+                for name in values[3:5]:
+                    if name != '':
+                        types.setdefault(name, (typ, unit))
+        return types
+
+    @functools.cached_property
+    def tables(self):
+        """
+        Tables decoded once into arrays in SI units (see decode_values).
+
+        Returns
+        -------
+        tables : dict
+            {table name: (values, unit)}, values is a float array with NaN in
+            place of empty or invalid entries; unit is taken from the sequence
+            row using the table ('Hz', 'dB', 's') or from the entries ('s' or '')
+
+        """
+        tables = dict()
+        for name, entries in self.params['Tables'].items():
+            unit = self.table_types.get(name, (None, ''))[1]
+            tables[name] = decode_values(entries, unit)
+        return tables
+
+    @functools.cached_property
+    def parameters(self):
+        """
+        Values of sequence parameters decoded once into SI units.
+
+        Returns
+        -------
+        parameters : dict
+            {parameter name: (value, unit)}, value is NaN if it isn't a number;
+            parameters of type 6 are times ('s')
+
+        """
+        parameters = dict()
+        for name, parameter in self.params['Parameters'].items():
+            value, unit = decode_value(parameter['Value'])
+            parameters[name] = (value, 's' if parameter['Type'] == 6 else unit)
+        return parameters
+
+
+def sequence_rows(binary, dic):
+    """
+    Read the rows of a TNMR sequence (NRows, NCols and Sequence) into dic.
+
+    The rows are stored in the same layout in all TNMR versions, so they can be
+    read without the rest of the PSEQ section.
+
+    Parameters
+    ----------
+    binary : Cursor
+        Cursor at the number of rows
+    dic : dict
+        Dictionary to store the sequence into
+
+    """
+    dic['NRows'] = binary.read_uint()
+    dic['NCols'] = binary.read_uint()
+
+    # Read TNMR sequence and store it into dictionary
+    dic['Sequence'] = dict()
+
+    for row in range(dic['NRows']):
+        # 28 bytes of useless data
+        binary.seek(TNTReader.PSEQROW.itemsize, 1)
+
+        # Read row index and use the row name as a new (sub)dictionary
+        binary.read_string()
+        row_name = binary.read_string().decode()
+        dic['Sequence'][row_name] = dict()
+
+        for column in range(dic['NCols']):
+            # Read a column value and use it as a new key to store tables.
+            col_name = binary.read_string().decode()
+            # [value, 0D-4D table names]
+            values = [col_name] + binary.read_strings(5, gap=4)
+            # whitespace
+            binary.seek(16,1)
+            dic['Sequence'][row_name][column] = values
+
+            # [Acq row, True (1) column] has some additional data
+            if row_name == 'Acq' and col_name == '1':
+                for i in range(6):
+                    binary.read_string()
+                binary.seek(1,1)
+
+def experiment_type(dic, dimension=2):
+    """
+    Identify a type of measurement from the sequence 2D tables.
+
+    Parameters
+    ----------
+    dic : dict
+        Parameters with NCols and Sequence (TNTReader.params or sequence_rows)
+    dimension : int
+        2 for tables swept along measurements, 3 for the next dimension of nested acquisitions
+
+    Returns
+    -------
+    typ : str
+        'fsw' (frequency sweep), 'att' (attenuation), 't1' (delay) or '' (single spectrum)
+    table : str
+        Name of the 2D table or None
+
+    """
+    for i in range(dic['NCols']):
+        for row, typ, _ in TABLE_ROWS:
+            table = dic['Sequence'][row][i][dimension+1] # index [3] is a 2D table, [4] a 3D table
+            if table != '':
+                return typ, table
+    return '', None
+
+def as_slice(value):
+    """
+    Convert None (everything), int (one item), tuple (start, stop[, step]) or slice to a slice.
+    """
+    if value is None:
+        return slice(None)
+    if isinstance(value, slice):
+        return value
+    if isinstance(value, tuple):
+        return slice(*value)
+    return slice(value, value+1 if value != -1 else None)
+
+def decode_value(text):
+    """
+    Decode a TNMR value such as '12.5u', '3m', '1s', '-2.5k' or '5 dB'.
+
+    Returns
+    -------
+    value : float
+        Value in SI units (NaN if text isn't a number)
+    unit : str
+        's' for times (also for a bare prefix, e.g. '10u'), 'Hz', 'dB' or ''
+
+    """
+    match = VALUE_RE.match(text)
+    if match is None:
+        return float('nan'), ''
+    number, suffix = match.groups()
+    unit = ''
+    for name in ('Hz', 'dB', 's'):
+        if suffix.endswith(name):
+            unit = name
+            suffix = suffix[:-len(name)]
+            break
+    if suffix not in PREFIXES:
+        return float('nan'), ''
+    if unit == '' and suffix in ('p', 'n', 'u', 'm'):
+        # TNMR writes delays with a prefix only
+        unit = 's'
+    exponent = PREFIXES[suffix]
+    # dividing keeps e.g. '12.5u' exactly 12.5e-6
+    if exponent < 0:
+        return float(number)/10**-exponent, unit
+    return float(number)*10**exponent, unit
+
+def decode_values(entries, unit=''):
+    """
+    Decode a list of TNMR values (e.g. a table) into an array.
+
+    Parameters
+    ----------
+    entries : list
+        Strings of values
+    unit : str
+        Unit of the values if they don't have one
+
+    Returns
+    -------
+    values : ndarray
+        Float array in SI units, NaN for empty or invalid entries
+    unit : str
+        Unit of the values
+
+    """
+    decoded = [decode_value(entry) for entry in entries]
+    values = np.array([value for value, _ in decoded], dtype=np.float64)
+    units = set(unit for _, unit in decoded if unit)
+    return values, unit or (units.pop() if len(units) == 1 else '')
 
 
 if __name__=="__main__":
-    tnt = TNTReader('D:\\Users\\IvanJkv\\LBCO\\20200910\\A5_63Cu_fsw_286K.tnt')
+    tnt = TNTReader(sys.argv[1])
+    print(tnt.version, tnt.experiment_type(), tnt.data.shape)
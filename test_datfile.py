@@ -0,0 +1,47 @@
+"""
+Tests of the vectorized .dat writer against the original per-point formatting.
+
+    python -m pytest test_datfile.py
+"""
+
+__author__ = "ijakovac@phy.hr"
+
+import io
+
+import numpy as np
+import pytest
+
+from datfile import format_measurement, write_data
+
+def reference_measurement(column, measurement, scans):
+    # per-point formatting of the original translator (grenoble.py)
+    reals = ['{0:.3E}'.format(float(np.real(column[point]))) for point in range(column.shape[0])]
+    imags = ['{0:.3E}'.format(float(np.imag(column[point]))) for point in range(column.shape[0])]
+    return 'measure {}\nscans {}\n'.format(measurement, scans) + '\t'.join(imags) + '\n' + '\t'.join(reals) + '\n'
+
+def random_columns(points, measurements, seed=0):
+    rng = np.random.default_rng(seed)
+    scale = 10.0**rng.integers(-12, 12, (points, measurements))
+    data = rng.standard_normal((points, measurements))*scale + 1j*rng.standard_normal((points, measurements))*scale
+    return data.astype(np.complex64)
+
+@pytest.mark.parametrize('points', [0, 1, 2, 1000])
+def test_format_measurement(points):
+    data = random_columns(points, 3)
+    for measurement in range(data.shape[1]):
+        assert format_measurement(data[:, measurement], measurement+1, 16) == \
+            reference_measurement(data[:, measurement], measurement+1, 16)
+
+def test_format_measurement_special_values():
+    values = np.array([np.nan, np.inf, -np.inf, 0.0, -0.0, 1e-45, 3.4e38], np.float32)
+    column = np.empty(len(values), np.complex64)
+    column.real, column.imag = values, values[::-1]
+    assert format_measurement(column, 7, 1) == reference_measurement(column, 7, 1)
+
+def test_write_data():
+    # small memory budget: several chunks of measurements
+    data = random_columns(64, 10, seed=1)
+    output = io.StringIO()
+    write_data(output, data, 4, memory=3*64*8)
+    assert output.getvalue() == ''.join(reference_measurement(data[:, measurement], measurement+1, 4)
+                                        for measurement in range(data.shape[1]))
@@ -0,0 +1,74 @@
+"""
+Tests of the PSEQ parser of TNTReader on synthetic files of every TNMR version.
+
+    python -m pytest test_tecmag.py
+"""
+
+__author__ = "ijakovac@phy.hr"
+
+import struct
+
+import numpy as np
+import pytest
+
+from tecmag import TNTReader, PSEQError, PSEQ_LAYOUTS, SEQUENCE_TAG
+from tntwriter import write_tnt, pseq_bytes
+
+SEQUENCE = {'F1_Freq': ['freqs'], 'F1_Atten': [''], 'Delay': ['']}
+TABLES = {'freqs': ['0', '1k', '2.5k']}
+PARAMETERS = {'d1': '10u', 'last_delay': '1s'}
+
+def write(path, version='TNT1.008', comment='synthetic comment'):
+    data = (np.arange(16*3).reshape(16, 3)*(1+1j)).astype(np.complex64)
+    write_tnt(str(path), data, version=version, sequence=SEQUENCE, tables=TABLES, parameters=PARAMETERS,
+              comment=comment)
+    return data
+
+@pytest.mark.parametrize('version', sorted(PSEQ_LAYOUTS))
+def test_round_trip(tmp_path, version):
+    path = tmp_path / 'file.tnt'
+    data = write(path, version)
+    tnt = TNTReader(str(path))
+    assert tnt.version == version
+    assert tnt.params['Message'] == ''
+    assert tnt.params['Tables'] == TABLES
+    assert {name: parameter['Value'] for name, parameter in tnt.params['Parameters'].items()} == PARAMETERS
+    assert tnt.params['Comments'] == 'synthetic comment'
+    assert tnt.experiment_type() == ('fsw', 'freqs')
+    np.testing.assert_array_equal(tnt.view(), data)
+
+def test_version_mismatch(tmp_path):
+    # file saved by new TNMR (tagged TNT1.008) with the sequence parameters of an old one
+    path = tmp_path / 'file.tnt'
+    write(path, 'TNT1.008')
+    new = pseq_bytes('TNT1.008', SEQUENCE, TABLES, PARAMETERS, 'synthetic comment')
+    old = pseq_bytes('TNT1.007', SEQUENCE, TABLES, PARAMETERS, 'synthetic comment')
+    # 4 blank bytes and the number of parameters follow the tables in TNT1.008
+    tables_end = new.index(bytes(4) + struct.pack('<II', len(PARAMETERS), 2) + b'd1')
+    mixed = new[:tables_end] + old[old.index(SEQUENCE_TAG):]
+    raw = path.read_bytes()
+    path.write_bytes(raw[:raw.index(new)] + mixed)
+
+    tnt = TNTReader(str(path))
+    assert tnt.version == 'TNT1.007'
+    assert tnt.params['Message'] == ' (TNT version mismatch!)'
+    assert list(tnt.params['Parameters']) == list(PARAMETERS)
+    assert tnt.params['Comments'] == 'synthetic comment'
+
+@pytest.mark.parametrize('version', ['TNT1.007', 'TNT1.008'])
+def test_truncated(tmp_path, version):
+    path = tmp_path / 'file.tnt'
+    write(path, version)
+    tnt = TNTReader(str(path))
+    pseq = tnt.section('PSEQ')
+    for length in (30, 200):
+        with pytest.raises(PSEQError) as err:
+            tnt.pseq_read(pseq[:length])
+        assert err.value.offset > 0
+        assert 'truncated section' in str(err.value)
+    # every cut either parses (cut after the parameters: no comment) or raises PSEQError
+    for length in range(len(pseq)):
+        try:
+            tnt.pseq_read(pseq[:length])
+        except PSEQError:
+            pass
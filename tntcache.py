@@ -0,0 +1,114 @@
+"""
+Persistent cache of parsed Tecmag .tnt file headers.
+"""
+
+__author__ = "ijakovac@phy.hr"
+
+import os
+import pickle
+import sqlite3
+import time
+
+def default_path():
+    """
+    Default location of the cache file (in the user's home directory).
+    """
+    return os.path.join(os.path.expanduser('~'), '.zagreb_to_grenoble', 'metadata.sqlite')
+
+# pending access times written at once when there are more of them (see MetadataCache.flush)
+FLUSH_ACCESSED = 100
+
+class MetadataCache():
+    """
+    Parsed headers of .tnt files stored in an SQLite file.
+
+    Entries are keyed by the absolute path of the file and are valid only while
+    the size and the modification time of the file are unchanged. When there are
+    more than max_entries entries, the least recently used ones are evicted.
+
+    Parameters
+    ----------
+    path : str
+        Name of the cache file (default: default_path())
+    max_entries : int
+        Maximum number of cached files
+
+    """
+    def __init__(self, path=None, max_entries=10000):
+        self.path = path or default_path()
+        self.max_entries = max_entries
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        # several processes may share the cache, sqlite locks the file
+        self.connection = sqlite3.connect(self.path, timeout=30)
+        # in WAL mode NORMAL syncs only at checkpoints: a power loss may lose the last
+        # updates (a re-parse) but can't corrupt the file, as OFF could
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        # access times of cache hits, written together by flush (a hit doesn't write to the file)
+        self.accessed = dict()
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS headers ('
+                                    'path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, '
+                                    'accessed REAL, state BLOB)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS headers_accessed ON headers (accessed)')
+
+    def get(self, filename, stat=None):
+        """
+        Return the cached state of a file or None if the file is not cached or has changed.
+        """
+        path = os.path.abspath(filename)
+        stat = stat or os.stat(filename)
+        row = self.connection.execute('SELECT size, mtime, state FROM headers WHERE path = ?', (path,)).fetchone()
+        if row is None:
+            return None
+        if (row[0], row[1]) != (stat.st_size, stat.st_mtime_ns):
+            # file was overwritten
+            with self.connection:
+                self.connection.execute('DELETE FROM headers WHERE path = ?', (path,))
+            return None
+        self.accessed[path] = time.time()
+        if len(self.accessed) >= FLUSH_ACCESSED:
+            self.flush()
+        return pickle.loads(row[2])
+
+    def put(self, filename, state, stat=None):
+        """
+        Store the state of a file, evicting the least recently used files if the cache is full.
+        """
+        path = os.path.abspath(filename)
+        stat = stat or os.stat(filename)
+        with self.connection:
+            # eviction below needs the access times of recent hits
+            self._write_accessed()
+            self.connection.execute('INSERT OR REPLACE INTO headers VALUES (?, ?, ?, ?, ?)',
+                                    (path, stat.st_size, stat.st_mtime_ns, time.time(),
+                                     pickle.dumps(state, pickle.HIGHEST_PROTOCOL)))
+            self.connection.execute('DELETE FROM headers WHERE path IN ('
+                                    'SELECT path FROM headers ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                                    (self.max_entries,))
+
+    def flush(self):
+        """
+        Write the access times of cache hits (done by put and close).
+        """
+        if self.accessed:
+            with self.connection:
+                self._write_accessed()
+
+    def _write_accessed(self):
+        self.connection.executemany('UPDATE headers SET accessed = ? WHERE path = ?',
+                                    [(accessed, path) for path, accessed in self.accessed.items()])
+        self.accessed.clear()
+
+    def clear(self):
+        self.accessed.clear()
+        with self.connection:
+            self.connection.execute('DELETE FROM headers')
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM headers').fetchone()[0]
+
+    def close(self):
+        self.flush()
+        self.connection.close()
@@ -0,0 +1,93 @@
+"""
+Thin client of the translation service (tntserver.py), quick to start from scripts.
+
+    python tntclient.py translate [--binary] [--gzip [LEVEL]] [--spectra] files_directories_or_globs
+    python tntclient.py merge [--double] [--disk] [--stitch] [--gzip [LEVEL]] files
+    python tntclient.py inspect [--params] files
+    python tntclient.py ping | shutdown
+"""
+
+__author__ = "ijakovac@phy.hr"
+
+# only the standard library, NumPy is imported by the server
+import argparse
+import json
+import os
+import socket
+import sys
+
+# default port of tntserver.py
+PORT = 48151
+
+def request(message, port=PORT, host='127.0.0.1', timeout=None):
+    """
+    Send a request (dict) to the service and return its answer (dict).
+    """
+    with socket.create_connection((host, port), timeout=timeout) as connection:
+        connection.sendall((json.dumps(message) + '\n').encode())
+        with connection.makefile('rb') as answer:
+            return json.loads(answer.readline())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Send requests to the translation service.')
+    parser.add_argument('--port', type=int, default=PORT, help='TCP port of the service (default: %(default)s)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    translate = commands.add_parser('translate', help='translate .tnt files')
+    translate.add_argument('paths', nargs='+', help='.tnt files, directories or glob patterns')
+    translate.add_argument('--binary', action='store_true', help='export also .npy data and .json parameters')
+    translate.add_argument('--spectra', action='store_true', help='export also spectra and intensities')
+    translate.add_argument('--gzip', nargs='?', type=int, const=6, default=None, metavar='LEVEL',
+                           help='write gzip compressed .dat.gz files')
+    merge = commands.add_parser('merge', help='sum files into a single _merged.dat file')
+    merge.add_argument('paths', nargs='+', help='.tnt or .dat files')
+    merge.add_argument('--double', action='store_true', help='merge in double precision')
+    merge.add_argument('--disk', action='store_true', help='merge one file at a time into a temporary file')
+    merge.add_argument('--stitch', action='store_true', help='merge frequency sweeps on the union of their frequencies')
+    merge.add_argument('--gzip', nargs='?', type=int, const=6, default=None, metavar='LEVEL',
+                       help='write a gzip compressed .dat.gz file')
+    inspect = commands.add_parser('inspect', help='print a summary of .tnt files as JSON')
+    inspect.add_argument('paths', nargs='+', help='.tnt files, directories or glob patterns')
+    inspect.add_argument('--params', action='store_true', help='include all parameters')
+    commands.add_parser('ping', help='check that the service is running')
+    commands.add_parser('shutdown', help='stop the service')
+    args = parser.parse_args(argv)
+
+    message = {'command': args.command}
+    if hasattr(args, 'paths'):
+        # the service may run in another directory
+        message['paths'] = [os.path.abspath(path) for path in args.paths]
+    if args.command == 'translate':
+        message['options'] = {'binary': args.binary, 'spectra': args.spectra, 'compresslevel': args.gzip}
+    elif args.command == 'merge':
+        message.update(double=args.double, disk=args.disk, stitch=args.stitch, compresslevel=args.gzip)
+    elif args.command == 'inspect':
+        message['params'] = args.params
+
+    try:
+        answer = request(message, args.port)
+    except ConnectionRefusedError:
+        print('Service is not running on port {} (start it with: python tntserver.py)'.format(args.port), file=sys.stderr)
+        return 2
+
+    if args.command == 'translate':
+        for result in answer.get('results', []):
+            if result['error'] is None:
+                print('OK      {}'.format(result['file']))
+            else:
+                print('FAILED  {} ({})'.format(result['file'], result['error']))
+    elif args.command == 'merge' and answer['ok'] and args.stitch:
+        print('STITCHED  {files} file(s) into {file_name} ({measurements} frequencies)'.format(**answer))
+    elif args.command == 'merge' and answer['ok']:
+        print('MERGED  {files} file(s) into {file_name} ({measurements} measurements, {scans} scans)'.format(**answer))
+    elif args.command == 'inspect':
+        print(json.dumps(answer.get('results', []), indent=1))
+    elif args.command == 'ping':
+        print('Service running (pid {pid}, {jobs} job(s))'.format(**answer))
+    for file, reason in answer.get('incompatible', []):
+        print('INCOMPATIBLE  {} ({})'.format(file, reason))
+    if 'error' in answer and 'incompatible' not in answer:
+        print(answer['error'], file=sys.stderr)
+    return 0 if answer['ok'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
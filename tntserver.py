@@ -0,0 +1,216 @@
+"""
+Translation service kept running in the background, so that scripts calling it
+after every measurement don't pay the start-up of Python, NumPy and the worker pool.
+
+    python tntserver.py [--port PORT] [-j JOBS] [--cache [PATH]]
+
+Requests are single lines of JSON sent to localhost (see tntclient.py):
+    {"command": "translate", "paths": [...], "options": {"binary": true, "compresslevel": 6, ...}}
+    {"command": "merge", "paths": [...], "file_name": null, "double": false, "disk": false, "stitch": false,
+     "compresslevel": null}
+    {"command": "inspect", "paths": [...], "params": false}
+    {"command": "ping"}
+    {"command": "shutdown"}
+Each request is answered with a single line of JSON, {"ok": true, ...} or {"ok": false, "error": "..."}.
+
+The port is not authenticated: any local user can send requests, and files are
+read and written with the permissions of the account running the service (run
+it under an account that may only touch the measurement data). To limit the
+damage, only existing .tnt files are translated (.tnt or .dat files merged), the
+file_name of a merge must be a .dat file in the directory of the merged files,
+and outputs never replace an input file.
+"""
+
+__author__ = "ijakovac@phy.hr"
+
+import argparse
+import concurrent.futures
+import json
+import os
+import socketserver
+import sys
+import threading
+
+import numpy as np
+
+from tecmag import TNTReader
+from translator import translate_batch, find_files, open_cache
+from merge import merge, merge_dat, stitch, MergeError
+from export import jsonable
+from tntcache import default_path
+
+# default port of the service (localhost only)
+PORT = 48151
+
+# keyword arguments of translate accepted from clients
+OPTIONS = ('binary', 'memory', 'file_jobs', 'compresslevel', 'spectra')
+
+def inspect(tnt, params=False):
+    """
+    Summary of a .tnt file (and all its parameters if params is True) as JSON types.
+    """
+    typ, table = tnt.experiment_type()
+    info = {'file': tnt.filename, 'version': tnt.version, 'shape': [int(n) for n in tnt.tmag['actual_npts']],
+            'experiment_type': typ, 'table': table, 'scans': tnt.accumulated_scans(),
+            'ob_freq': float(tnt.params['ob_freq'][0]), 'magnet_field': float(tnt.params['magnet_field']),
+            'actual_temperature': float(tnt.params['actual_temperature']),
+            'nuclei': jsonable(tnt.params['nuclei'][0].rstrip(b'\0')), 'comments': tnt.params['Comments']}
+    if params:
+        info['params'] = jsonable(tnt.params)
+    return info
+
+def input_files(paths, extensions=('.tnt',)):
+    """
+    Expand paths (see translator.find_files), refusing anything but existing files with one of the extensions.
+    """
+    files = find_files(paths)
+    rejected = [file for file in files if not (file.lower().endswith(extensions) and os.path.isfile(file))]
+    if rejected:
+        raise ValueError('Only existing {} files are accepted: {}'.format(' or '.join(extensions), ', '.join(rejected)))
+    return files
+
+def output_name(file_name, files):
+    """
+    Refuse an output file_name that isn't a .dat file in the directory of one of the input files.
+
+    The service writes with the permissions of its own account, so clients can't choose arbitrary paths.
+    Returns the resolved file_name (None for the default name).
+    """
+    if file_name is None:
+        return None
+    directories = {os.path.dirname(os.path.realpath(file)) for file in files}
+    if not file_name.endswith(('.dat', '.dat.gz')) or os.path.dirname(os.path.realpath(file_name)) not in directories:
+        raise ValueError("Output '{}' must be a .dat file in the directory of the merged files".format(file_name))
+    return os.path.realpath(file_name)
+
+class Service():
+    """
+    Requests handled by the server, with the header cache and the pool of processes kept open.
+
+    Parameters
+    ----------
+    jobs : int
+        Number of worker processes (default: number of CPUs, 1 translates in the server process)
+    cache_path : str
+        Name of the MetadataCache file (default: no cache)
+
+    """
+    def __init__(self, jobs=None, cache_path=None):
+        self.jobs = jobs or os.cpu_count() or 1
+        self.cache_path = cache_path
+        self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.jobs) if self.jobs > 1 else None
+
+    def handle(self, request):
+        """
+        Answer a request (dict), see the module documentation.
+        """
+        command = request.get('command')
+        if command == 'ping':
+            return {'ok': True, 'pid': os.getpid(), 'jobs': self.jobs}
+        if command == 'translate':
+            return self.translate(request)
+        if command == 'merge':
+            return self.merge(request)
+        if command == 'inspect':
+            return self.inspect(request)
+        raise ValueError("Unknown command '{}'".format(command))
+
+    def translate(self, request):
+        files = input_files(request.get('paths', []))
+        options = {key: value for key, value in request.get('options', dict()).items() if key in OPTIONS}
+        results = []
+        for file, error, _ in translate_batch(files, self.jobs, self.cache_path, pool=self.pool, **options):
+            results.append({'file': file, 'error': error})
+        return {'ok': all(result['error'] is None for result in results), 'results': results}
+
+    def merge(self, request):
+        files = input_files(request.get('paths', []), ('.tnt', '.dat', '.dat.gz'))
+        file_name = output_name(request.get('file_name'), files)
+        dtype = np.complex128 if request.get('double') else np.complex64
+        try:
+            if request.get('stitch'):
+                measurements, scans, file_name = stitch(files, file_name,
+                                                        compresslevel=request.get('compresslevel'))
+                scans = scans.tolist()
+            elif files and all(file.endswith(('.dat', '.dat.gz')) for file in files):
+                measurements, scans, file_name = merge_dat(files, file_name, dtype,
+                                                           request.get('compresslevel'))
+            else:
+                measurements, scans, file_name = merge(files, file_name, dtype,
+                                                       'disk' if request.get('disk') else 'memory',
+                                                       request.get('compresslevel'))
+        except MergeError as err:
+            return {'ok': False, 'error': str(err), 'incompatible': err.incompatible}
+        return {'ok': True, 'file_name': file_name, 'files': len(files), 'measurements': measurements, 'scans': scans}
+
+    def inspect(self, request):
+        results = []
+        for file in find_files(request.get('paths', [])):
+            try:
+                tnt = TNTReader(file, header_only=True, cache=open_cache(self.cache_path))
+                results.append(inspect(tnt, request.get('params', False)))
+            except Exception as err:
+                results.append({'file': file, 'error': '{}: {}'.format(type(err).__name__, err)})
+        return {'ok': all('error' not in result for result in results), 'results': results}
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Reads one JSON request per line and writes one JSON answer per line.
+    """
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if request.get('command') == 'shutdown':
+                    answer = {'ok': True}
+                    # shutdown() waits for serve_forever, so it can't run in this thread
+                    threading.Thread(target=self.server.shutdown).start()
+                else:
+                    answer = self.server.service.handle(request)
+            except Exception as err:
+                answer = {'ok': False, 'error': '{}: {}'.format(type(err).__name__, err)}
+            self.wfile.write((json.dumps(answer) + '\n').encode())
+            self.wfile.flush()
+
+class Server(socketserver.ThreadingTCPServer):
+    """
+    TCP server on localhost answering requests of several clients at once.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=PORT, jobs=None, cache_path=None):
+        # only local clients, the service reads and writes any file it is given
+        super(Server, self).__init__(('127.0.0.1', port), RequestHandler)
+        self.service = Service(jobs, cache_path)
+
+    def server_close(self):
+        super(Server, self).server_close()
+        self.service.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the translation service on localhost.')
+    parser.add_argument('--port', type=int, default=PORT, help='TCP port (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('--cache', nargs='?', const=default_path(), default=None, metavar='PATH',
+                        help='cache parsed headers (default PATH: {})'.format(default_path()))
+    args = parser.parse_args(argv)
+
+    with Server(args.port, args.jobs, args.cache) as server:
+        print('Serving on 127.0.0.1:{} with {} job(s) (Ctrl+C to stop)'.format(args.port, server.service.jobs))
+        sys.stdout.flush()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""
+Writer of synthetic Tecmag .tnt data files (for tests and benchmarks).
+
+Only the parts of the file read by TNTReader are filled in, everything else is zero.
+"""
+
+__author__ = "ijakovac@phy.hr"
+
+import struct
+
+import numpy as np
+
+from tecmag import TNTReader, ANSI
+
+def _string(value):
+    # strings are stored with preceding UInt32 lengths
+    if isinstance(value, str):
+        value = value.encode(ANSI)
+    return struct.pack('<I', len(value)) + value
+
+def _u32(value):
+    return struct.pack('<I', value)
+
+def _tlv(tag, length, flag=1):
+    return struct.pack('<4sII', tag, flag, length)
+
+def pseq_bytes(version, sequence, tables, parameters, comment=''):
+    """
+    Build the PSEQ section in the layout read by TNTReader.pseq_read.
+
+    Parameters
+    ----------
+    version : str
+        TNMR version tag, e.g. 'TNT1.008'
+    sequence : dict
+        {row name: [2D table name or (2D, 3D) table names per column]}
+    tables : dict
+        {table name: list of table values}
+    parameters : dict
+        {parameter name: value}
+    comment : str
+        Experiment comment
+
+    """
+    ncols = max([len(cols) for cols in sequence.values()] + [1])
+    out = [b'1.17 BIN', _string('synthetic.tps'), _string(''), _u32(len(sequence)), _u32(ncols)]
+    for row_name, columns in sequence.items():
+        out.append(bytes(TNTReader.PSEQROW.itemsize))
+        out.append(_string(''))
+        out.append(_string(row_name))
+        for column in range(ncols):
+            col_name = '1' if row_name == 'Acq' else ''
+            out.append(_string(col_name))
+            table = columns[column] if column < len(columns) else ''
+            names = table if isinstance(table, tuple) else (table, '')
+            for dim in range(5):
+                out.append(_string(names[dim-2] if dim in (2, 3) else ''))
+                out.append(bytes(4))
+            out.append(bytes(16))
+            if row_name == 'Acq' and col_name == '1':
+                out.extend(_string('') for _ in range(6))
+                out.append(bytes(1))
+
+    if version == 'TNT1.008':
+        out.append(_u32(0))
+    else:
+        out.append(bytes(128))
+        out.append(_u32(0))
+    out.append(_u32(len(tables)))
+    for name, values in tables.items():
+        out.append(_string(name))
+        out.append(_string(' '.join(values)))
+        out.append(_string('+ Add'))
+        out.append(_string('+ Add ' + name))
+        out.append(_string('Every pass'))
+        out.append(bytes(36))
+        out.extend(_string('') for _ in range(3))
+        out.append(bytes(4 if version == 'TNT1.003' else 12))
+
+    if version == 'TNT1.008':
+        out.append(bytes(4))
+    else:
+        out.append(_u32(1))
+        out.append(_string('Sequence'))
+        out.append(_u32(len(parameters)))
+        out.extend(_string(name) for name in parameters)
+    out.append(_u32(len(parameters)))
+    for name, value in parameters.items():
+        out.append(_string(name))
+        out.append(_u32(1))
+        out.append(_string(value))
+        out.append(_u32(6))
+        out.append(_string(''))
+        out.append(_string(''))
+        out.append(bytes(12))
+        out.append(_string(name))
+        out.append(_string(value))
+        out.append(bytes(16))
+
+    out.append(bytes(8))
+    out.append(b'CMNT')
+    out.append(_u32(1 if comment else 0))
+    if comment:
+        out.append(_string(comment))
+    return b''.join(out)
+
+def write_tnt(filename, data, version='TNT1.008', sequence=None, tables=None, parameters=None,
+              comment='', **tmag):
+    """
+    Write a synthetic Tecmag .tnt data file.
+
+    Parameters
+    ----------
+    filename : str
+        Name of file to write to
+    data : ndarray
+        Complex data of up to four dimensions (points, measurements, ...)
+    version : str
+        TNMR version tag, 'TNT1.003' to 'TNT1.008'
+    sequence, tables, parameters, comment
+        Sequence part of the file, see pseq_bytes
+    tmag
+        Values of TNTTMAG fields, e.g. ob_freq=84.5
+
+    """
+    data = np.asarray(data, np.dtype('<c8'))
+    npts = list(data.shape) + [1]*(4 - data.ndim)
+    sequence = sequence if sequence is not None else {'F1_Freq': [''], 'F1_Atten': [''], 'Delay': ['']}
+    tables = tables or dict()
+    parameters = parameters if parameters is not None else {'d1': '10u', 'last_delay': '1s'}
+
+    header = np.zeros(1, TNTReader.TNTTMAG)[0]
+    header['npts'] = npts
+    header['actual_npts'] = npts
+    header['acq_points'] = npts[0]
+    header['scans'] = 1
+    header['actual_scans'] = 1
+    header['repeat_times'] = 1
+    header['magnet_field'] = 9.0
+    header['ob_freq'][0] = 100.0
+    header['dwell'][0] = 1e-6
+    header['actual_temperature'] = 300.0
+    header['date'] = b'2020/09/10 12:00:00'
+    header['nuclei'][0] = b'63Cu'
+    header['sequence'] = b'synthetic.tps'
+    for name, value in tmag.items():
+        header[name] = value
+
+    tmg2 = np.zeros(1, TNTReader.TNTTMG2)[0]
+
+    with open(filename, 'wb') as tntfile:
+        tntfile.write(version.encode())
+        tntfile.write(_tlv(b'TMAG', TNTReader.TNTTMAG.itemsize))
+        tntfile.write(header.tobytes())
+        tntfile.write(_tlv(b'DATA', data.size*8))
+        tntfile.write(np.asfortranarray(data).tobytes(order='F'))
+        tntfile.write(_tlv(b'TMG2', TNTReader.TNTTMG2.itemsize))
+        tntfile.write(tmg2.tobytes())
+        tntfile.write(b'PSEQ' + _u32(1))
+        tntfile.write(pseq_bytes(version, sequence, tables, parameters, comment))
+
+def synthetic(filename, typ='fsw', npts=1024, measurements=16, version='TNT1.008', seed=0, planes=1):
+    """
+    Write a .tnt file with random data of a given experiment type.
+
+    Parameters
+    ----------
+    filename : str
+        Name of file to write to
+    typ : str
+        'fsw' (F1_Freq table), 'att' (F1_Atten table), 't1' (Delay table) or '' (no table)
+    npts : int
+        Number of points per measurement
+    measurements : int
+        Number of measurements (1 for a 1D file)
+    version : str
+        TNMR version tag, 'TNT1.003' to 'TNT1.008'
+    planes : int
+        Number of planes of 3D data, swept by a 3D delay table ('table3')
+
+    Returns
+    -------
+    data : ndarray
+        Data written to the file
+
+    """
+    rng = np.random.default_rng(seed)
+    shape = (npts, measurements) if planes == 1 else (npts, measurements, planes)
+    data = (rng.standard_normal(shape) + 1j*rng.standard_normal(shape))*1e3
+    rows = {'fsw': 'F1_Freq', 'att': 'F1_Atten', 't1': 'Delay'}
+    sequence = {row: [''] for row in rows.values()}
+    tables = dict()
+    if typ in rows:
+        sequence[rows[typ]] = ['table']
+        if typ == 'fsw':
+            tables['table'] = ['{}'.format(1000*i) for i in range(measurements)]
+        elif typ == 'att':
+            tables['table'] = ['{}'.format(i) for i in range(measurements)]
+        else:
+            tables['table'] = ['{}u'.format(10*(i+1)) for i in range(measurements)]
+    if planes > 1:
+        sequence['Delay'] = [(sequence['Delay'][0], 'table3')]
+        tables['table3'] = ['{}m'.format(i+1) for i in range(planes)]
+    write_tnt(filename, data, version, sequence, tables, comment='Synthetic {} data'.format(typ or '1D'),
+              ob_freq=[84.5, 0, 0, 0], scans=16, actual_scans=16)
+    return data.astype(np.complex64)
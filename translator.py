@@ -0,0 +1,585 @@
+"""
+Translation of Tecmag .tnt files to Grenoble .dat files.
+
+Can be used without the GUI:
+    python translator.py [-j JOBS] [--merge] file_or_directory_or_glob [...]
+"""
+
+__author__ = "ijakovac@phy.hr"
+
+import argparse
+import collections
+import concurrent.futures
+import glob
+import io
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+from tecmag import TNTReader, as_slice
+from datfile import (write_header, write_data, format_measurement, open_dat, dat_name, check_output, columns,
+                     MEMORY, POINT_TEXT)
+from merge import merge, merge_dat, stitch, MergeError
+from tntcache import MetadataCache, default_path
+from export import export_binary
+from processing import export_spectra
+from profiler import Profile, NULL_PROFILE
+
+def translate(file, file_name=None, cache=None, binary=False, memory=MEMORY, profile=None, file_jobs=1,
+              compresslevel=None, spectra=False, measurements=None, points=None, echo_window=None):
+    """
+    Translate a Tecmag .tnt file to a .dat file.
+
+    Parameters
+    ----------
+    file : str or TNTReader
+        Name of .tnt file (or already opened file) to read from
+    file_name : str
+        Name of .dat file to write to (default: file with .dat or .dat.gz extension,
+        _part.dat for partial exports)
+    cache : MetadataCache
+        Cache of parsed headers
+    binary : bool
+        Export also .npy data and .json parameters (see export.export_binary)
+    memory : int
+        Memory budget (bytes) for data read at once; peak memory doesn't depend on file size
+    profile : Profile
+        Records time of reading and writing stages and bytes read/written
+    file_jobs : int
+        Number of processes formatting measurements of this file (see write_data_parallel)
+    compresslevel : int
+        Compress the .dat file with gzip while writing it (see datfile.open_dat)
+    spectra : bool
+        Export also spectra and intensities processed with the stored parameters (see processing.export_spectra)
+    measurements, points : slice, tuple or int
+        Export only a range of measurements or points (see TNTReader.view), e.g. for spot checks
+    echo_window : int
+        Export only points within echo_window of the echo center (replaces points)
+
+    Returns
+    -------
+    measurements : int
+        Number of measurements
+    scans : int
+        Number of scans
+    data : ndarray
+        Array of NMR data (memory-mapped, not read into memory).
+
+    """
+    profile = profile or NULL_PROFILE
+    tnt = file if isinstance(file, TNTReader) else TNTReader(file, cache=cache, profile=profile)
+    data = tnt.data
+    scans = tnt.accumulated_scans()
+
+    if echo_window is not None:
+        points = tnt.echo_window(echo_window)
+    partial = measurements is not None or points is not None
+    if file_name is None:
+        # partial exports don't replace the full translation
+        file_name = dat_name(tnt.filename, compresslevel, '_part' if partial else '')
+    check_output(file_name, [tnt.filename])
+
+    with open_dat(file_name, 'w', compresslevel) as output:
+        with profile.stage('header'):
+            if partial:
+                # only the selected part of the memmap is read
+                data = tnt.view(measurements, points)
+                write_header(output, tnt, as_slice(measurements), None if points is None else data.shape[0],
+                             step=abs(as_slice(points).step or 1))
+            else:
+                write_header(output, tnt)
+            profile.bytes_written += output.tell()
+        if partial:
+            write_data(output, data, scans, memory, profile=profile)
+        elif file_jobs > 1 and columns(data).shape[1] > 1:
+            write_data_parallel(output, tnt, scans, file_jobs, memory, profile)
+        else:
+            write_data(output, data, scans, memory, tnt.read_measurements, profile)
+    if binary:
+        with profile.stage('binary'):
+            export_binary(tnt)
+            profile.bytes_written += data.nbytes
+    if spectra:
+        with profile.stage('spectra'):
+            export_spectra(tnt, memory=memory)
+
+    return (columns(data).shape[1], scans, data)
+
+# file opened by each process of write_data_parallel
+_worker_tnt = None
+
+def _open_worker_file(filename):
+    global _worker_tnt
+    _worker_tnt = TNTReader(filename, header_only=True)
+
+def _format_block(start, stop, scans):
+    # each worker reads its own slice of the file
+    block = _worker_tnt.read_measurements(start, stop)
+    return ''.join([format_measurement(block[:, i], start+i+1, scans) for i in range(block.shape[1])])
+
+def write_data_parallel(output, tnt, scans, jobs, memory=MEMORY, profile=NULL_PROFILE):
+    """
+    Write the %Data% block of a single file, formatting measurements in a pool of processes.
+
+    Blocks of measurements are formatted concurrently and written in order. At
+    most 2*jobs blocks are in flight. Blocks are sized so that their data and
+    formatted text (returned by the worker and its pickled copy) together fit the
+    memory budget.
+
+    Parameters
+    ----------
+    output : file
+        Text file opened for writing
+    tnt : TNTReader
+        File to translate
+    scans : int
+        Number of scans
+    jobs : int
+        Number of processes
+    memory : int
+        Memory budget (bytes) for blocks in flight in all processes
+
+    """
+    npts, measurements = columns(tnt.data).shape
+    window = 2*jobs
+    # binary data in the worker, formatted text in the worker and its pickled copy here
+    chunk = max(1, min(memory // (window*npts*(8 + 2*POINT_TEXT)), -(-measurements // window)))
+    blocks = [(start, min(start+chunk, measurements)) for start in range(0, measurements, chunk)]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=_open_worker_file,
+                                                initargs=(tnt.filename,)) as pool:
+        pending = collections.deque()
+        for start, stop in blocks:
+            pending.append(pool.submit(_format_block, start, stop, scans))
+            if len(pending) >= window:
+                _write_block(output, pending.popleft(), profile)
+        while pending:
+            _write_block(output, pending.popleft(), profile)
+
+def _write_block(output, future, profile):
+    # formatting happens in the workers, only the wait for the block is timed here
+    with profile.stage('wait'):
+        text = future.result()
+    with profile.stage('write'):
+        output.write(text)
+    profile.bytes_written += len(text)
+
+def _put(items, item, stop):
+    # put to a bounded queue, giving up when the pipeline is stopped
+    while not stop.is_set():
+        try:
+            items.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+
+def _get(items, stop):
+    # get from a queue, None when the pipeline is stopped
+    while not stop.is_set():
+        try:
+            return items.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return None
+
+def _read_stage(files, blocks, stop, cache_path, memory, profile):
+    # stage 1: parse headers and read data of the next files
+    for file in files:
+        if stop.is_set():
+            return
+        record = Profile(file) if profile else NULL_PROFILE
+        try:
+            tnt = TNTReader(file, cache=open_cache(cache_path), profile=record)
+            _put(blocks, ('header', file, tnt, record), stop)
+            measurements = columns(tnt.data).shape[1]
+            chunk = max(1, memory // max(1, tnt.data.shape[0]*8))
+            for start in range(0, measurements, chunk):
+                _put(blocks, ('block', file, start, tnt.read_measurements(start, min(start+chunk, measurements))), stop)
+            _put(blocks, ('end', file), stop)
+        except Exception as err:
+            _put(blocks, ('error', file, '{}: {}'.format(type(err).__name__, err), record), stop)
+    _put(blocks, None, stop)
+
+def _format_stage(blocks, texts, stop):
+    # stage 2: format headers and measurements
+    scans = dict()
+    profiles = dict()
+    while True:
+        item = _get(blocks, stop)
+        if item is None:
+            _put(texts, None, stop)
+            return
+        kind, file = item[:2]
+        try:
+            if kind == 'header':
+                tnt, profiles[file] = item[2:]
+                scans[file] = tnt.accumulated_scans()
+                with profiles[file].stage('header'):
+                    output = io.StringIO()
+                    write_header(output, tnt)
+                item = ('header', file, tnt, profiles[file], output.getvalue())
+            elif kind == 'block':
+                start, block = item[2:]
+                with profiles[file].stage('format'):
+                    text = ''.join([format_measurement(block[:, i], start+i+1, scans[file]) for i in range(block.shape[1])])
+                item = ('text', file, text)
+            elif kind == 'end':
+                del scans[file], profiles[file]
+        except Exception as err:
+            item = ('error', file, '{}: {}'.format(type(err).__name__, err), profiles.get(file, NULL_PROFILE))
+        _put(texts, item, stop)
+
+def translate_pipeline(files, prefetch=4, cache_path=None, profile=False, binary=False, memory=MEMORY,
+                       compresslevel=None, spectra=False, status=None):
+    """
+    Translate files in a pipeline of three threads, overlapping I/O with formatting.
+
+    Stage 1 parses the headers and reads the data of the next files (in blocks
+    of measurements), stage 2 formats them and stage 3 (the calling thread)
+    writes them. Stages are connected by queues of at most prefetch blocks,
+    so about 2*prefetch+3 blocks of data are in memory at once.
+
+    Parameters
+    ----------
+    files : list
+        Names of .tnt files
+    prefetch : int
+        Length of the queues between stages
+    cache_path : str
+        Name of the MetadataCache file (default: no cache)
+    profile : bool
+        Profile every file
+    binary : bool
+        Export also .npy data and .json parameters (see export.export_binary)
+    memory : int
+        Memory budget (bytes) of all blocks in the pipeline
+    compresslevel : int
+        Compress the .dat files with gzip (in the writing thread)
+    spectra : bool
+        Export also spectra and intensities (see processing.export_spectra)
+    status : function
+        Called after each written block with a dictionary of files (done), bytes (written),
+        seconds (elapsed), read_queue and write_queue (number of blocks waiting in the queues)
+
+    Yields
+    ------
+    file : str
+        Name of the translated file, in order of files
+    error : str
+        Error message or None if the file was translated
+    record : dict
+        Profile.record() of the file or None
+
+    """
+    blocks = queue.Queue(maxsize=prefetch)
+    texts = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    block_memory = max(1, memory // (2*prefetch + 3))
+    threads = [threading.Thread(target=_read_stage, args=(files, blocks, stop, cache_path, block_memory, profile), daemon=True),
+               threading.Thread(target=_format_stage, args=(blocks, texts, stop), daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    start = time.perf_counter()
+    done = written = 0
+    output = None
+    failed = set()
+    try:
+        while True:
+            item = texts.get()
+            if item is None:
+                break
+            kind, file = item[:2]
+            if file in failed:
+                continue
+            try:
+                if kind == 'header':
+                    tnt, record, text = item[2:]
+                    file_name = dat_name(tnt.filename, compresslevel)
+                    check_output(file_name, [tnt.filename])
+                    output = open_dat(file_name, 'w', compresslevel)
+                elif kind == 'text':
+                    text = item[2]
+                elif kind == 'end':
+                    output.close()
+                    output = None
+                    if binary:
+                        with record.stage('binary'):
+                            export_binary(tnt)
+                            record.bytes_written += tnt.data.nbytes
+                    if spectra:
+                        with record.stage('spectra'):
+                            export_spectra(tnt, memory=memory)
+                    done += 1
+                    yield file, None, record.record() if profile else None
+                    continue
+                else:
+                    raise RuntimeError(item[2])
+                with record.stage('write'):
+                    output.write(text)
+                record.bytes_written += len(text)
+                written += len(text)
+                if status is not None:
+                    status({'files': done, 'bytes': written, 'seconds': time.perf_counter() - start,
+                            'read_queue': blocks.qsize(), 'write_queue': texts.qsize()})
+            except Exception as err:
+                if output is not None:
+                    output.close()
+                    output = None
+                failed.add(file)
+                done += 1
+                error = item[2] if kind == 'error' else '{}: {}'.format(type(err).__name__, err)
+                record = item[3] if kind == 'error' else record
+                yield file, error, record.record() if profile else None
+    finally:
+        stop.set()
+        if output is not None:
+            output.close()
+
+def find_files(paths):
+    """
+    Expand files, directories and glob patterns into a list of .tnt files.
+
+    Files of each directory and glob pattern are sorted by name (the first one
+    gives the header and the name of merged files), files given by name keep
+    their order.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '*.tnt'))))
+        elif glob.has_magic(path):
+            files.extend(sorted(glob.glob(path)))
+        else:
+            files.append(path)
+    # keep the order, drop duplicates
+    return list(dict.fromkeys(os.path.normpath(file) for file in files))
+
+# connections to cache files opened by the current thread
+_caches = threading.local()
+
+def open_cache(path):
+    # one connection to the cache file per thread (sqlite3 connections can't be shared between threads)
+    if not path:
+        return None
+    caches = _caches.__dict__.setdefault('caches', dict())
+    if path not in caches:
+        caches[path] = MetadataCache(path)
+    return caches[path]
+
+def _translate_file(file, cache_path=None, profile=False, options={}):
+    # runs in a worker process; only the status (and the profile) is sent back, never the data
+    record = Profile(file) if profile else None
+    try:
+        translate(file, cache=open_cache(cache_path), profile=record, **options)
+        error = None
+    except Exception as err:
+        error = '{}: {}'.format(type(err).__name__, err)
+    return error, record.record() if profile else None
+
+def translate_batch(files, jobs=None, cache_path=None, profile=False, pool=None, **options):
+    """
+    Translate files in a pool of processes.
+
+    Parameters
+    ----------
+    files : list
+        Names of .tnt files
+    jobs : int
+        Number of processes (default: number of CPUs, 1 translates in this process)
+    cache_path : str
+        Name of the MetadataCache file (default: no cache)
+    profile : bool
+        Profile every file
+    pool : concurrent.futures.Executor
+        Already running pool of processes to use instead of starting a new one (jobs is ignored)
+    options
+        Keyword arguments of translate (binary, memory, file_jobs, compresslevel, spectra,
+        measurements, points, echo_window)
+
+    Yields
+    ------
+    file : str
+        Name of the translated file, in order of completion
+    error : str
+        Error message or None if the file was translated
+    record : dict
+        Profile.record() of the file or None
+
+    """
+    if pool is not None:
+        yield from _completed(pool, files, cache_path, profile, options)
+        return
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(files) < 2:
+        for file in files:
+            yield (file,) + _translate_file(file, cache_path, profile, options)
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs, len(files))) as pool:
+        yield from _completed(pool, files, cache_path, profile, options)
+
+def _completed(pool, files, cache_path, profile, options):
+    futures = {pool.submit(_translate_file, file, cache_path, profile, options): file for file in files}
+    for future in concurrent.futures.as_completed(futures):
+        yield (futures[future],) + future.result()
+
+def parse_range(text):
+    """
+    Parse 'START:STOP[:STEP]' (any part may be empty) or 'N' into a slice or an int.
+    """
+    parts = [int(part) if part.strip() else None for part in text.split(':')]
+    if len(parts) == 1:
+        return parts[0]
+    if len(parts) > 3:
+        raise argparse.ArgumentTypeError("invalid range '{}'".format(text))
+    return slice(*parts)
+
+class StatusLine():
+    """
+    Status of translate_pipeline shown on one line of stderr (at most every interval seconds).
+    """
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.shown = 0.0
+
+    def __call__(self, status):
+        if status['seconds'] - self.shown < self.interval:
+            return
+        self.shown = status['seconds']
+        sys.stderr.write('\r{files} file(s)  {rate:.1f} MB/s  read queue {read_queue}  write queue {write_queue}   '.format(
+            rate=status['bytes']/1e6/max(status['seconds'], 1e-9), **status))
+        sys.stderr.flush()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Translate Tecmag .tnt files to Grenoble .dat files.')
+    parser.add_argument('paths', nargs='+', help='.tnt files, directories or glob patterns')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('-m', '--merge', action='store_true',
+                        help='sum all files (.tnt or .dat) into a single _merged.dat file (header from the first file)')
+    parser.add_argument('--stitch', action='store_true',
+                        help='merge frequency sweeps on the union of their frequencies into a _stitched.dat file '
+                             '(measurements at the same frequency are averaged weighted by scans, '
+                             'written in blocks of frequencies within --memory)')
+    parser.add_argument('--double', action='store_true',
+                        help='merge in double precision')
+    parser.add_argument('--disk', action='store_true',
+                        help='merge one file at a time into a temporary file instead of all files at once')
+    parser.add_argument('--cache', nargs='?', const=default_path(), default=None, metavar='PATH',
+                        help='cache parsed headers (default PATH: {})'.format(default_path()))
+    parser.add_argument('--binary', action='store_true',
+                        help='export also .npy data and .json parameters next to each .dat file')
+    parser.add_argument('--spectra', action='store_true',
+                        help='export also spectra and integrated intensities, processed with the parameters stored in '
+                             'each file (see processing.py)')
+    parser.add_argument('--measurements', type=parse_range, default=None, metavar='START:STOP[:STEP]',
+                        help='export only a range of measurements (counted from 0 like Python slices)')
+    parser.add_argument('--points', type=parse_range, default=None, metavar='START:STOP[:STEP]',
+                        help='export only a range of points, a STEP decimates')
+    parser.add_argument('--echo-window', type=int, default=None, metavar='N',
+                        help='export only N points on each side of the echo center')
+    parser.add_argument('--gzip', nargs='?', type=int, const=6, default=None, choices=range(10), metavar='LEVEL',
+                        help='write gzip compressed .dat.gz files (LEVEL 1 fastest to 9 smallest, default: 6)')
+    parser.add_argument('--memory', type=float, default=MEMORY/2**20, metavar='MB',
+                        help='memory budget per file for data read at once (default: %(default)g MB)')
+    parser.add_argument('--file-jobs', type=int, default=1, metavar='N',
+                        help='processes formatting measurements of each file (for single large files)')
+    parser.add_argument('--pipeline', nargs='?', type=int, const=4, default=0, metavar='N',
+                        help='read, format and write in three overlapping threads with queues of N blocks '
+                             '(for files on slow disks; -j and --file-jobs are ignored)')
+    parser.add_argument('--profile', action='store_true',
+                        help='write per-file stage timings as JSON lines to stderr (or to --profile-file)')
+    parser.add_argument('--profile-file', default=None, metavar='FILE',
+                        help='append the --profile JSON lines to FILE instead of stderr')
+    args = parser.parse_args(argv)
+    if args.profile_file is not None:
+        if args.profile_file.lower().endswith('.tnt'):
+            # never append to acquired data
+            parser.error("--profile-file can't be a .tnt file: {}".format(args.profile_file))
+        args.profile = True
+
+    files = find_files(args.paths)
+    if not files:
+        print('No .tnt files found.', file=sys.stderr)
+        return 1
+
+    if args.stitch:
+        try:
+            measurements, scans, file_name = stitch(files, memory=int(args.memory*2**20), compresslevel=args.gzip)
+        except MergeError as err:
+            for file, reason in err.incompatible:
+                print('INCOMPATIBLE  {} ({})'.format(file, reason))
+            return 1
+        except (OSError, ValueError) as err:
+            print('FAILED  {} ({}: {})'.format(getattr(err, 'filename', None) or 'stitch', type(err).__name__, err))
+            return 1
+        print('STITCHED  {} file(s) into {} ({} frequencies, {} to {} scans)'.format(
+            len(files), file_name, measurements, scans.min(), scans.max()))
+        return 0
+
+    if args.merge:
+        dtype = np.complex128 if args.double else np.complex64
+        translated = [file.endswith(('.dat', '.dat.gz')) for file in files]
+        if any(translated) and not all(translated):
+            print("Can't merge .tnt and .dat files together, translate these files first:", file=sys.stderr)
+            for file, dat in zip(files, translated):
+                if not dat:
+                    print('  {}'.format(file), file=sys.stderr)
+            return 1
+        try:
+            if all(translated):
+                # previously translated files
+                measurements, scans, file_name = merge_dat(files, dtype=dtype, compresslevel=args.gzip)
+            else:
+                measurements, scans, file_name = merge(files, dtype=dtype, accumulator='disk' if args.disk else 'memory',
+                                                       compresslevel=args.gzip)
+        except MergeError as err:
+            for file, reason in err.incompatible:
+                print('INCOMPATIBLE  {} ({})'.format(file, reason))
+            return 1
+        except (OSError, ValueError) as err:
+            print('FAILED  {} ({}: {})'.format(getattr(err, 'filename', None) or 'merge', type(err).__name__, err))
+            return 1
+        print('MERGED  {} file(s) into {} ({} measurements, {} scans)'.format(len(files), file_name, measurements, scans))
+        return 0
+
+    failed = 0
+    profile_output = None
+    if args.profile:
+        profile_output = sys.stderr if args.profile_file is None else open(args.profile_file, 'a')
+    partial = args.measurements is not None or args.points is not None or args.echo_window is not None
+    # partial exports are small, they are not worth the pipeline
+    pipeline = args.pipeline if not partial else 0
+    if pipeline:
+        results = translate_pipeline(files, args.pipeline, args.cache, args.profile,
+                                     binary=args.binary, memory=int(args.memory*2**20), compresslevel=args.gzip,
+                                     spectra=args.spectra, status=StatusLine())
+    else:
+        results = translate_batch(files, args.jobs, args.cache, args.profile,
+                                  binary=args.binary, memory=int(args.memory*2**20), file_jobs=args.file_jobs,
+                                  compresslevel=args.gzip, spectra=args.spectra, measurements=args.measurements,
+                                  points=args.points, echo_window=args.echo_window)
+    for file, error, record in results:
+        if record is not None:
+            record['error'] = error
+            profile_output.write(json.dumps(record) + '\n')
+            profile_output.flush()
+        if pipeline:
+            # clear the status line
+            sys.stderr.write('\r' + ' '*79 + '\r')
+        if error is None:
+            print('OK      {}'.format(file))
+        else:
+            failed += 1
+            print('FAILED  {} ({})'.format(file, error))
+    print('{} file(s) translated, {} failed.'.format(len(files)-failed, failed))
+    if profile_output not in (None, sys.stderr):
+        profile_output.close()
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Incremental translation of .tnt files appearing in a directory.
+
+    python watch.py [--interval SECONDS] [--settle SECONDS] directory
+"""
+
+__author__ = "ijakovac@phy.hr"
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+from translator import translate, open_cache
+from tntcache import default_path
+from datfile import dat_name
+
+class Watcher():
+    """
+    Translates new or modified .tnt files of a directory.
+
+    Translated files are remembered (by size and modification time) in a state file,
+    so a restarted watcher doesn't translate them again. Files whose .dat output is
+    newer than the .tnt file are considered up to date. A file is translated only
+    after its size and modification time haven't changed for settle seconds, i.e.
+    once the spectrometer has finished writing it.
+
+    Parameters
+    ----------
+    directory : str
+        Directory with .tnt files
+    state_file : str
+        Name of the state file (default: .translated.json in the directory)
+    settle : float
+        Seconds a file has to stay unchanged before it is translated
+    cache : MetadataCache
+        Cache of parsed headers
+
+    """
+    def __init__(self, directory, state_file=None, settle=5.0, cache=None):
+        self.directory = directory
+        self.state_file = state_file or os.path.join(directory, '.translated.json')
+        self.settle = settle
+        self.cache = cache
+        # {file: [size, mtime_ns, error]} of translated (or failed) files
+        self.state = dict()
+        if os.path.exists(self.state_file):
+            with open(self.state_file) as f:
+                self.state = json.load(f)
+        # {file: (size, mtime_ns, time of the first observation of that size and mtime)}
+        self.pending = dict()
+
+    def save(self):
+        # write to a temporary file first so an interrupted watcher never leaves a broken state file
+        temp = self.state_file + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(temp, self.state_file)
+
+    def up_to_date(self, file, stat):
+        if self.state.get(file, [None, None])[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return True
+        dat = dat_name(file)
+        return os.path.exists(dat) and os.stat(dat).st_mtime_ns >= stat.st_mtime_ns
+
+    def ready(self, now=None):
+        """
+        Return files that are new or modified and have stopped changing.
+        """
+        now = time.time() if now is None else now
+        files = []
+        for file in sorted(glob.glob(os.path.join(self.directory, '*.tnt'))):
+            try:
+                stat = os.stat(file)
+            except OSError:
+                continue # removed in the meantime
+            if self.up_to_date(file, stat):
+                self.pending.pop(file, None)
+                continue
+            key = (stat.st_size, stat.st_mtime_ns)
+            if file not in self.pending or self.pending[file][:2] != key:
+                self.pending[file] = key + (now,)
+            elif now - self.pending[file][2] >= self.settle:
+                files.append(file)
+        return files
+
+    def poll(self):
+        """
+        Translate all files that are ready.
+
+        Returns
+        -------
+        results : list
+            (file, error) pairs, error is None if the file was translated
+
+        """
+        results = []
+        for file in self.ready():
+            stat = os.stat(file)
+            try:
+                translate(file, cache=self.cache)
+                error = None
+            except Exception as err:
+                # a failed file is tried again only after it is modified
+                error = '{}: {}'.format(type(err).__name__, err)
+            self.state[file] = [stat.st_size, stat.st_mtime_ns, error]
+            self.pending.pop(file, None)
+            results.append((file, error))
+        if results:
+            self.save()
+        return results
+
+    def run(self, interval=2.0, callback=None):
+        """
+        Poll the directory every interval seconds until interrupted.
+        """
+        while True:
+            for file, error in self.poll():
+                if callback is not None:
+                    callback(file, error)
+            time.sleep(interval)
+
+def report(file, error):
+    if error is None:
+        print('OK      {}'.format(file))
+    else:
+        print('FAILED  {} ({})'.format(file, error))
+    sys.stdout.flush()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Translate new or modified .tnt files of a directory.')
+    parser.add_argument('directory', help='directory with .tnt files')
+    parser.add_argument('--interval', type=float, default=2.0, help='seconds between directory scans')
+    parser.add_argument('--settle', type=float, default=5.0,
+                        help='seconds a file has to stay unchanged before it is translated')
+    parser.add_argument('--state', default=None, help='state file (default: DIRECTORY/.translated.json)')
+    parser.add_argument('--cache', nargs='?', const=default_path(), default=None, metavar='PATH',
+                        help='cache parsed headers (default PATH: {})'.format(default_path()))
+    args = parser.parse_args(argv)
+
+    watcher = Watcher(args.directory, args.state, args.settle, open_cache(args.cache))
+    print('Watching {} (Ctrl+C to stop)'.format(args.directory))
+    try:
+        watcher.run(args.interval, report)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())